@@ -0,0 +1,501 @@
+import argparse
+import colorsys
+import gzip
+import io
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import distinctipy
+import numpy as np
+import pandas as pd
+from dateutil import parser as date_parser
+
+import chart_plots
+import chart_renderer
+import log_extractor
+import player_data
+
+# Constants
+BENCHMARK_LINES = 2_000_000
+BENCHMARK_PLAYERS = 200
+BENCHMARK_START = datetime(2020, 1, 1)
+BENCHMARK_ARCHIVE_LINES = 20_000
+BENCHMARK_ARCHIVE_COUNTS = [25, 50, 100, 200]
+BENCHMARK_SESSIONS = 100_000
+BENCHMARK_SESSION_DAYS = 365
+BENCHMARK_EVENTS = 10_000_000
+BENCHMARK_WIDE_SESSIONS = 1_000_000
+BENCHMARK_WIDE_DAYS = 5 * 365
+# Servers of the multi-server comparison and players.txt lines of every server
+BENCHMARK_SERVERS = 4
+BENCHMARK_SERVER_LINES = 1_000_000
+# Default scale of the benchmark suite and number of timed runs of every benchmark
+BENCHMARK_SUITE_PLAYERS = 200
+BENCHMARK_SUITE_DAYS = 90
+BENCHMARK_SUITE_SESSIONS_PER_DAY = 300
+BENCHMARK_SUITE_CRASH_RATE = 0.05
+BENCHMARK_SUITE_NOISE_RATIO = 20
+BENCHMARK_REPEAT = 3
+BENCHMARK_OUTPUT = "./benchmark.json"
+# Modules whose import time is measured and number of slowest imports shown for each of them
+BENCHMARK_IMPORT_MODULES = ["player_data", "chart_renderer", "player_charts", "chart_export"]
+BENCHMARK_IMPORT_SLOWEST = 5
+
+# Write a players.txt file in the format produced by log_extractor.py
+def generate_players_file(path, line_count = BENCHMARK_LINES, player_count = BENCHMARK_PLAYERS, seed = 0):
+    rng = random.Random(seed)
+    players = [f"Player_{i}" for i in range(player_count)]
+    date = BENCHMARK_START
+    with open(path, "w") as file:
+        for i in range(line_count):
+            date += timedelta(seconds = rng.randint(1, 120))
+            file.write(f"[{date.strftime('%m/%d/%y %H:%M:%S')}] {rng.choice(players)} {'joined' if i % 2 == 0 else 'left'} the game\n")
+
+# Write one gzipped server log per day, mostly chat with some join, left and crash lines
+def generate_server_logs(folder, archive_count, line_count = BENCHMARK_ARCHIVE_LINES, player_count = BENCHMARK_PLAYERS, seed = 0):
+    rng = random.Random(seed)
+    players = [f"Player_{i}" for i in range(player_count)]
+    for day in range(archive_count):
+        date = BENCHMARK_START + timedelta(days = day)
+        with gzip.open(os.path.join(folder, f"{date.strftime('%Y-%m-%d')}-1.log.gz"), "wt", encoding = "utf-8") as archive:
+            for i in range(line_count):
+                date += timedelta(milliseconds = rng.randint(1, 86_400_000 // line_count))
+                timestamp = f"{date.strftime('%d%b%Y %H:%M:%S')}.{date.microsecond // 1000:03d}"
+                chance = rng.random()
+                if chance < 0.01:
+                    archive.write(f"[{timestamp}] [Server thread/INFO] [minecraft/MinecraftServer]: {rng.choice(players)} {'joined' if chance < 0.005 else 'left'} the game\n")
+                elif chance < 0.01001:
+                    archive.write(f"[{timestamp}] [Server thread/ERROR] [minecraft/Minecraft]: This crash report has been saved to: ./crash-reports/crash.txt\n")
+                else:
+                    archive.write(f"[{timestamp}] [Server thread/INFO] [minecraft/MinecraftServer]: <{rng.choice(players)}> message {rng.random()}\n")
+
+# Sessions of up to 4 hours spread over a year, built directly in memory
+def generate_sessions(session_count = BENCHMARK_SESSIONS, player_count = BENCHMARK_PLAYERS, day_count = BENCHMARK_SESSION_DAYS, seed = 0):
+    rng = np.random.default_rng(seed)
+    start = player_data.to_seconds(BENCHMARK_START) + np.sort(rng.integers(0, day_count * player_data.SECONDS_PER_DAY, session_count))
+    end = start + rng.integers(60, 4 * player_data.SECONDS_PER_HOUR, session_count)
+    player = rng.integers(0, player_count, session_count).astype(np.int32)
+    return player_data.SessionStore([f"Player_{i}" for i in range(player_count)], distinctipy.get_colors(player_count, rng = seed), player, start, end)
+
+# Scale of the synthetic server simulated by the benchmark suite: crash rate is in crashes per day and noise ratio in
+# chat, world save and mod lines written for every join or left line
+GeneratorOptions = namedtuple("GeneratorOptions", ["players", "days", "sessions_per_day", "crash_rate", "noise_ratio", "seed"])
+# Relative chance of a session starting at every hour of the day, most players connect in the evening
+SESSION_HOUR_WEIGHTS = [2, 1, 1, 1, 1, 1, 1, 2, 3, 4, 5, 6, 7, 7, 8, 9, 10, 12, 14, 16, 16, 14, 10, 5]
+NOISE_LINES = [
+    "[Server thread/INFO] [minecraft/MinecraftServer]: <{player}> message {value}",
+    "[Server thread/INFO] [minecraft/MinecraftServer]: {player} has made the advancement [Stone Age]",
+    "[Server thread/INFO] [minecraft/MinecraftServer]: {player} lost connection: Disconnected",
+    "[User Authenticator #1/INFO] [minecraft/ServerLoginPacketListenerImpl]: UUID of player {player} is {value}",
+    "[Server thread/INFO] [minecraft/MinecraftServer]: Saving the game (this may take a moment!)",
+    "[Server thread/WARN] [minecraft/MinecraftServer]: Can't keep up! Is the server overloaded? Running {value}ms or 40 ticks behind",
+]
+
+# Simulate the play sessions of a server, returns the player names and the player, start, end and crashed flag of every
+# session in milliseconds since EPOCH, sorted by start, and the time of every crash
+def simulate_server(options):
+    rng = np.random.default_rng(options.seed)
+    players = [f"Player_{i}" for i in range(options.players)]
+    # A few players play much more than the others
+    player_weights = 1 / np.arange(1, options.players + 1) ** 0.8
+    count = options.days * options.sessions_per_day
+    player = rng.choice(options.players, count, p = player_weights / player_weights.sum())
+    hour = rng.choice(24, count, p = np.array(SESSION_HOUR_WEIGHTS) / sum(SESSION_HOUR_WEIGHTS))
+    start = player_data.to_seconds(BENCHMARK_START) * 1000 + (np.repeat(np.arange(options.days), options.sessions_per_day) * 24 + hour) * 3_600_000 + rng.integers(0, 3_600_000, count)
+    end = start + np.clip(rng.lognormal(np.log(45 * 60_000), 1, count), 60_000, 8 * 3_600_000).astype(np.int64)
+    # A player is only connected once, the sessions starting before the previous one of the same player ended are dropped
+    order = np.lexsort((start, player))
+    player, start, end = player[order], start[order], end[order]
+    span = int(end.max()) + 1 if count else 1
+    reach = np.maximum.accumulate(player.astype(np.int64) * span + end)
+    kept = np.append(True, player[1:].astype(np.int64) * span + start[1:] > reach[:-1]) if count else np.zeros(0, dtype = bool)
+    player, start, end = player[kept], start[kept], end[kept]
+    # A crash disconnects every connected player without a left line
+    crashes = np.sort(player_data.to_seconds(BENCHMARK_START) * 1000 + rng.integers(0, options.days * 86_400_000, rng.poisson(options.crash_rate * options.days)))
+    next_crash = np.searchsorted(crashes, start, side = "right")
+    crashed = next_crash < len(crashes)
+    crashed[crashed] = crashes[next_crash[crashed]] < end[crashed]
+    end[crashed] = crashes[next_crash[crashed]]
+    order = np.argsort(start, kind = "stable")
+    return players, player[order], start[order], end[order], crashed[order], crashes
+
+# Join, left and crash lines of a simulated server as (milliseconds since EPOCH, player or None, action), sorted by time
+def get_server_events(player, start, end, crashed, crashes):
+    time = np.concatenate((start, end[~crashed], crashes))
+    event_player = np.concatenate((player, player[~crashed], np.full(len(crashes), -1)))
+    action = np.concatenate((np.zeros(len(start), dtype = np.int8), np.ones(np.count_nonzero(~crashed), dtype = np.int8), np.full(len(crashes), 2, dtype = np.int8)))
+    order = np.argsort(time, kind = "stable")
+    return time[order], event_player[order], action[order]
+
+def format_server_timestamp(milliseconds, days):
+    day, rest = divmod(int(milliseconds), 86_400_000)
+    if day not in days:
+        days[day] = (player_data.EPOCH + timedelta(days = day)).strftime("%d%b%Y")
+    return f"{days[day]} {rest // 3_600_000:02d}:{rest // 60_000 % 60:02d}:{rest // 1000 % 60:02d}.{rest % 1000:03d}"
+
+# Write the simulated server as one gzipped log per day, with noise lines between the join, left and crash lines
+def write_server_logs(folder, options, players, player, start, end, crashed, crashes):
+    rng = np.random.default_rng(options.seed + 1)
+    time, event_player, action = get_server_events(player, start, end, crashed, crashes)
+    noise_count = int(len(time) * options.noise_ratio)
+    noise_time = np.sort(player_data.to_seconds(BENCHMARK_START) * 1000 + rng.integers(0, options.days * 86_400_000, noise_count))
+    noise_line, noise_player, noise_value = rng.integers(0, len(NOISE_LINES), noise_count), rng.integers(0, options.players, noise_count), rng.integers(0, 1000, noise_count)
+    # Join, left and crash lines are written before the noise lines of the same millisecond
+    lines = np.concatenate((np.arange(len(time)), -1 - np.arange(noise_count)))
+    lines = lines[np.argsort(np.concatenate((time, noise_time)), kind = "stable")]
+    time, event_player, action, noise_time, noise_line, noise_player, noise_value = (values.tolist() for values in (time, event_player, action, noise_time, noise_line, noise_player, noise_value))
+    days, archive, archive_day = {}, None, None
+    for line in lines.tolist():
+        line_time = time[line] if line >= 0 else noise_time[-1 - line]
+        if line_time // 86_400_000 != archive_day:
+            if archive:
+                archive.close()
+            archive_day = line_time // 86_400_000
+            # The archives don't store the time they were written at so the same options always generate the same files
+            archive = io.TextIOWrapper(gzip.GzipFile(os.path.join(folder, f"{(player_data.EPOCH + timedelta(days = archive_day)).strftime('%Y-%m-%d')}-1.log.gz"), "wb", mtime = 0), encoding = "utf-8")
+        timestamp = format_server_timestamp(line_time, days)
+        if line < 0:
+            archive.write(f"[{timestamp}] {NOISE_LINES[noise_line[-1 - line]].format(player = players[noise_player[-1 - line]], value = noise_value[-1 - line])}\n")
+        elif action[line] == 2:
+            archive.write(f"[{timestamp}] [Server thread/ERROR] [minecraft/Minecraft]: This crash report has been saved to: ./crash-reports/crash-{timestamp.replace(' ', '_')}.txt\n")
+        else:
+            archive.write(f"[{timestamp}] [Server thread/INFO] [minecraft/MinecraftServer]: {players[event_player[line]]} {'joined' if action[line] == 0 else 'left'} the game\n")
+    if archive:
+        archive.close()
+    return len(lines)
+
+# Write the simulated server as a players.txt file, the way log_extractor.py extracts it from the server logs
+def write_players_file(path, players, player, start, end, crashed, crashes):
+    time, event_player, action = get_server_events(player, start, end, crashed, crashes)
+    connected, line_count = set(), 0
+    with open(path, "w") as file:
+        for line_time, line_player, line_action in zip(time.tolist(), event_player.tolist(), action.tolist()):
+            timestamp = (player_data.EPOCH + timedelta(milliseconds = line_time)).strftime("%m/%d/%y %H:%M:%S")
+            if line_action == 2:
+                file.writelines(f"[{timestamp}] {players[connected_player]} left (server crash)\n" for connected_player in sorted(connected))
+                line_count += len(connected)
+                connected.clear()
+            elif line_action == 0:
+                connected.add(line_player)
+                file.write(f"[{timestamp}] {players[line_player]} joined the game\n")
+                line_count += 1
+            else:
+                connected.discard(line_player)
+                file.write(f"[{timestamp}] {players[line_player]} left the game\n")
+                line_count += 1
+    return line_count
+
+# Write a data.csv file for custom_monthy_chart.py with the monthly hours played by the most active players
+def write_monthly_csv(path, options, players, player, start, end):
+    month = ((start // 1000 // player_data.SECONDS_PER_DAY) - start.min() // 1000 // player_data.SECONDS_PER_DAY) // 30 if len(start) else start
+    month_count = int(month.max()) + 1 if len(month) else 1
+    hours = np.bincount(player * month_count + month, weights = (end - start) / 3_600_000, minlength = options.players * month_count).reshape(options.players, month_count)
+    with open(path, "w", encoding = "utf-8") as file:
+        file.write("Hours played;Hours;Month\n")
+        file.write(f"{BENCHMARK_START.strftime('%m-%Y')}\n")
+        for i in range(min(options.players, 20)):
+            color = "".join(f"{round(channel * 255):02x}" for channel in colorsys.hsv_to_rgb(i / 20, 0.6, 0.9))
+            file.write(f"{players[i]};#{color};{';'.join(str(int(value)) for value in hours[i])}\n")
+
+# Generate the server logs, players.txt and data.csv of a simulated server in a folder
+def generate_dataset(folder, options):
+    players, player, start, end, crashed, crashes = simulate_server(options)
+    os.makedirs(os.path.join(folder, "logs"), exist_ok = True)
+    os.makedirs(os.path.join(folder, "data"), exist_ok = True)
+    log_lines = write_server_logs(os.path.join(folder, "logs"), options, players, player, start, end, crashed, crashes)
+    events = write_players_file(os.path.join(folder, "data", "players.txt"), players, player, start, end, crashed, crashes)
+    write_monthly_csv(os.path.join(folder, "data.csv"), options, players, player, start, end)
+    return {"sessions": len(start), "crashes": len(crashes), "events": events, "log_lines": log_lines, "log_archives": len(os.listdir(os.path.join(folder, "logs")))}
+
+def benchmark(name, function, line_count, unit = "lines"):
+    start = time.perf_counter()
+    function()
+    duration = time.perf_counter() - start
+    print(f"{name}: {duration:.2f}s ({line_count / duration:,.0f} {unit}/s)")
+    return duration
+
+# Compare dateutil on every line with the format-aware TimestampParser used by parse_data
+def benchmark_timestamp_parser(path, line_count):
+    def read_with_dateutil():
+        with open(path, "r") as file:
+            for line in file:
+                match = re.match(r"\[(.*?)\] ([a-zA-Z0-9_]{1,20}) (joined|left)", line)
+                if match:
+                    date_parser.parse(match.group(1))
+
+    def read_with_timestamp_parser():
+        timestamp_parser = player_data.TimestampParser()
+        with open(path, "r") as file:
+            for line in file:
+                match = re.match(r"\[(.*?)\] ([a-zA-Z0-9_]{1,20}) (joined|left)", line)
+                if match:
+                    timestamp_parser.parse(match.group(1))
+
+    before = benchmark("dateutil", read_with_dateutil, line_count)
+    after = benchmark("TimestampParser", read_with_timestamp_parser, line_count)
+    print(f"Speedup: {before / after:.1f}x")
+
+# Compare decoding every server log line and running both regex patterns with the byte classifier used by both log readers
+def benchmark_line_classifier(path, line_count):
+    def read_with_regex():
+        with gzip.open(path, "rt", encoding = "utf-8") as archive:
+            for line in archive:
+                line = line.strip()
+                if not re.match(log_extractor.LOG_PATTERN.pattern.decode(), line):
+                    re.match(log_extractor.CRASH_PATTERN.pattern.decode(), line)
+
+    def read_with_classifier():
+        for action, line in log_extractor.classify_lines(log_extractor.read_lines(path)):
+            (log_extractor.CRASH_PATTERN if action == log_extractor.ACTION_CRASH else log_extractor.LOG_PATTERN).match(line)
+
+    before = benchmark("Regex on every line", read_with_regex, line_count)
+    after = benchmark("Line classifier", read_with_classifier, line_count)
+    print(f"Speedup: {before / after:.1f}x")
+
+# Compare one barh per session and one axvline per day with the collections drawn by plot_gantt_chart_time
+def benchmark_gantt_rendering(session_count = BENCHMARK_SESSIONS):
+    sessions = generate_sessions(session_count)
+    start_date, end_date = player_data.to_seconds(BENCHMARK_START), player_data.to_seconds(BENCHMARK_START + timedelta(days = BENCHMARK_SESSION_DAYS + 1))
+    data = player_data.filter_data(sessions, start_date, end_date, player_data.FILTER_TIME_PLAYED, 0, 0)
+    options = chart_renderer.ChartOptions(player_data.to_datetime(start_date), player_data.to_datetime(end_date), chart_renderer.GRAPH_GANTT_PLAY_TIME, chart_renderer.DISPLAY_NAME, player_data.SORT_NAME, False, player_data.FILTER_TIME_PLAYED, 0, 0)
+
+    def plot_with_barh(ax):
+        day_player, day = data.get_days_played()
+        dates = pd.date_range(player_data.to_datetime(day.min() * player_data.SECONDS_PER_DAY), player_data.to_datetime((day.max() + 1) * player_data.SECONDS_PER_DAY))
+        player_indexes = data.sessions.get_player_indexes()
+        for player in [player for player in data.players if data.session_count[player]]:
+            for index in player_indexes[player]:
+                ax.barh(chart_renderer.get_player_label(data.get_name(player), options), (data.sessions.end[index] - data.sessions.start[index]) / player_data.SECONDS_PER_DAY, left = player_data.to_datetime(data.sessions.start[index]), color = data.get_color(player))
+        for date in dates:
+            ax.axvline(date, color = "gray", linestyle = "-", linewidth = 0.5)
+
+    def render(plot):
+        fig = chart_renderer.create_figure()
+        plot(fig.add_subplot(111))
+        fig.canvas.draw()
+
+    before = benchmark("One barh per session", lambda: render(plot_with_barh), session_count, "sessions")
+    after = benchmark("Collections", lambda: render(lambda ax: chart_plots.plot_gantt_chart_time(ax, data, options)), session_count, "sessions")
+    print(f"Speedup: {before / after:.1f}x")
+
+# Peak memory of log_extractor.py for a growing number of daily archives
+def benchmark_extraction_memory(archive_counts = BENCHMARK_ARCHIVE_COUNTS):
+    for archive_count in archive_counts:
+        with tempfile.TemporaryDirectory() as folder:
+            os.makedirs(os.path.join(folder, "data"))
+            generate_server_logs(os.path.join(folder, "data"), archive_count)
+            # Run the extractor in its own process, with the archives read in that process too, and read its peak RSS from VmHWM
+            code = "import log_extractor; log_extractor.PROCESSES = 1; log_extractor.extract_logs(); print(open('/proc/self/status').read().split('VmHWM:')[1].split()[0])"
+            start = time.perf_counter()
+            output = subprocess.run([sys.executable, "-c", code], cwd = folder, env = dict(os.environ, PYTHONPATH = os.path.dirname(os.path.abspath(__file__))), capture_output = True, text = True, check = True).stdout
+            print(f"{archive_count} archives ({archive_count * BENCHMARK_ARCHIVE_LINES:,} lines): {time.perf_counter() - start:.2f}s, peak RSS {int(output.split()[-1]) / 1024:.1f} MB")
+
+# Filter a multi-year range and count its hourly and daily active players, the first query also builds the rollups of the store
+def benchmark_wide_range(session_count = BENCHMARK_WIDE_SESSIONS, day_count = BENCHMARK_WIDE_DAYS):
+    sessions = generate_sessions(session_count, day_count = day_count)
+    start_date = player_data.to_seconds(BENCHMARK_START)
+    end_date = start_date + (day_count + 1) * player_data.SECONDS_PER_DAY - 1
+
+    def query():
+        player_data.filter_data.cache_clear()
+        data = player_data.filter_data(sessions, start_date, end_date, player_data.FILTER_TIME_PLAYED, 0, 0)
+        data.get_hourly_active_players()
+        data.get_daily_active_players()
+
+    benchmark("First wide range", query, session_count, "sessions")
+    benchmark("Next wide range", query, session_count, "sessions")
+
+# Load a binary event file written like the log extractor does, then build the sessions from it
+def benchmark_events_file(event_count = BENCHMARK_EVENTS, player_count = BENCHMARK_PLAYERS, seed = 0):
+    rng = np.random.default_rng(seed)
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "players" + player_data.EVENTS_FILE_EXTENSION)
+        records = np.zeros(event_count, dtype = player_data.EVENT_RECORD)
+        records["time"] = player_data.to_seconds(BENCHMARK_START) + np.cumsum(rng.integers(0, 10, event_count))
+        records["player"] = rng.integers(0, player_count, event_count)
+        records["join"] = rng.random(event_count) < 0.5
+        records.tofile(path)
+        with open(path + player_data.EVENTS_NAMES_EXTENSION, "w") as names_file:
+            names_file.writelines(f"Player_{i}\n" for i in range(player_count))
+        print(f"{event_count:,} events, {os.path.getsize(path) / 1024 / 1024:.0f} MB")
+        events = None
+        def load():
+            nonlocal events
+            events = player_data.read_events_file(path)
+        benchmark("Map event file", load, event_count, "events")
+        benchmark("Build sessions", lambda: player_data.PlayerEvents.concatenate([events]).get_sessions([], player_data.to_seconds(datetime.now())), event_count, "events")
+
+# Parse the data folders of several servers one after the other, then in parallel processes, without the data cache
+def benchmark_servers(server_count = BENCHMARK_SERVERS, line_count = BENCHMARK_SERVER_LINES):
+    with tempfile.TemporaryDirectory() as folder:
+        player_data.DATA_FOLDER = os.path.join(folder, "data")
+        player_data.DATA_CACHE_FOLDER = os.path.join(folder, "cache", "data")
+        player_data.SERVERS_FILE = os.path.join(folder, "servers.json")
+        for server in range(server_count):
+            os.makedirs(os.path.join(player_data.DATA_FOLDER, f"server_{server}"))
+            generate_players_file(os.path.join(player_data.DATA_FOLDER, f"server_{server}", "players.txt"), line_count, seed = server)
+
+        def parse(processes):
+            shutil.rmtree(player_data.DATA_CACHE_FOLDER, ignore_errors = True)
+            player_data.PARSE_PROCESSES = processes
+            player_data.parse_data()
+
+        before = benchmark(f"{server_count} servers in one process", lambda: parse(1), server_count * line_count)
+        after = benchmark(f"{server_count} servers in parallel", lambda: parse(None), server_count * line_count)
+        print(f"Speedup: {before / after:.1f}x")
+
+# Import time of the application modules in a fresh process, read from the -X importtime report
+def benchmark_import_time(modules = BENCHMARK_IMPORT_MODULES):
+    for module in modules:
+        output = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd = os.path.dirname(os.path.abspath(__file__)), capture_output = True, text = True, check = True).stderr
+        # Lines are "import time: self [us] | cumulative | imported package"
+        imports = [(int(line.split("|")[1]), line.split("|")[2].strip()) for line in output.splitlines() if line.startswith("import time:") and line.split("|")[1].strip().isdigit()]
+        total = next(cumulative for cumulative, name in imports if name == module)
+        slowest = sorted([(cumulative, name) for cumulative, name in imports if name != module and "." not in name], reverse = True)[:BENCHMARK_IMPORT_SLOWEST]
+        print(f"import {module}: {total / 1000:.0f}ms (slowest: {', '.join(f'{name} {cumulative / 1000:.0f}ms' for cumulative, name in slowest)})")
+
+# Versions and commit the results were measured with, so that runs on different machines or commits can be told apart
+def get_environment():
+    import matplotlib
+    commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd = os.path.dirname(os.path.abspath(__file__)), capture_output = True, text = True).stdout.strip()
+    return {"python": platform.python_version(), "platform": platform.platform(), "processor": platform.processor(), "cpu_count": os.cpu_count(), "numpy": np.__version__, "matplotlib": matplotlib.__version__, "commit": commit or None, "date": datetime.now().isoformat(timespec = "seconds")}
+
+# Time a benchmark of the suite repeat times, then run it once more with tracemalloc to record its peak memory
+# setup is run before every run and is not timed
+def run_benchmark(results, name, function, repeat, setup = None, count = None, unit = None):
+    times = []
+    for i in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    if setup:
+        setup()
+    tracemalloc.start()
+    function()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    result = {"name": name, "times": times, "min": min(times), "median": statistics.median(times), "peak_memory": peak_memory}
+    if count:
+        result.update({"count": count, "unit": unit, "per_second": count / min(times)})
+    results.append(result)
+    print(f"{name}: {min(times):.3f}s min, {statistics.median(times):.3f}s median, {peak_memory / 1024 / 1024:.1f} MB peak" + (f" ({count / min(times):,.0f} {unit}/s)" if count else ""))
+
+# Generate a dataset and benchmark the extraction, parsing, filtering, every chart and the monthly chart csv on it
+def run_suite(folder, options, repeat = BENCHMARK_REPEAT, selected = None):
+    start = time.perf_counter()
+    dataset = generate_dataset(folder, options)
+    print(f"Generated {dataset['sessions']:,} sessions, {dataset['log_lines']:,} log lines in {dataset['log_archives']} archives and {dataset['events']:,} players.txt lines in {time.perf_counter() - start:.1f}s")
+    results = []
+    def is_selected(name):
+        return not selected or any(name.startswith(prefix) for prefix in selected)
+
+    # Every file read or written by the benchmarked modules is kept in the dataset folder, archives are read by a single process
+    log_extractor.DATA_FOLDER = os.path.join(folder, "logs")
+    log_extractor.OUTPUT_FILE = os.path.join(folder, "extracted", "players.txt")
+    log_extractor.MANIFEST_FILE = os.path.join(folder, "extracted", "log_extractor.json")
+    log_extractor.PROCESSES = 1
+    player_data.DATA_FOLDER = os.path.join(folder, "data")
+    player_data.DATA_CACHE_FOLDER = os.path.join(folder, "cache", "data")
+    player_data.SERVERS_FILE = os.path.join(folder, "servers.json")
+    player_data.player_colors = player_data.PlayerColors(os.path.join(folder, "cache", "player_colors.json"))
+
+    def reset_extraction():
+        shutil.rmtree(os.path.join(folder, "extracted"), ignore_errors = True)
+        os.makedirs(os.path.join(folder, "extracted"))
+
+    if is_selected("extract"):
+        run_benchmark(results, "extract", log_extractor.extract_logs, repeat, reset_extraction, dataset["log_lines"], "lines")
+    if is_selected("parse/cold"):
+        run_benchmark(results, "parse/cold", player_data.parse_data, repeat, lambda: shutil.rmtree(player_data.DATA_CACHE_FOLDER, ignore_errors = True), dataset["events"], "lines")
+    if is_selected("parse/cached"):
+        player_data.parse_data()
+        run_benchmark(results, "parse/cached", player_data.parse_data, repeat, None, dataset["events"], "lines")
+
+    sessions, min_date, max_date = player_data.parse_data()
+    # Colors are only generated once per player and kept in the color cache, so they are not part of the timings
+    sessions.get_colors()
+    ranges = {"full": (datetime.combine(min_date.date(), datetime.min.time()), datetime.combine(max_date.date(), datetime.max.time())), "week": (datetime.combine((max_date - timedelta(days = 6)).date(), datetime.min.time()), datetime.combine(max_date.date(), datetime.max.time()))}
+    for range_name, (start_date, end_date) in ranges.items():
+        range_options = chart_renderer.ChartOptions(start_date, end_date, chart_renderer.CHART_TYPES[0], chart_renderer.DISPLAY_NAME, player_data.SORT_NAME, False, player_data.FILTER_TIME_PLAYED, 0, 0)
+        if is_selected(f"filter/{range_name}"):
+            run_benchmark(results, f"filter/{range_name}", lambda: chart_renderer.get_filtered_data(sessions, range_options), repeat, player_data.filter_data.cache_clear, len(sessions), "sessions")
+        # Heads are downloaded from the internet, the charts are rendered with the player names only
+        for chart_type in chart_renderer.CHART_TYPES:
+            name = f"render/{range_name}/{chart_type.lower().replace(' ', '-')}"
+            if is_selected(name):
+                chart_options = range_options._replace(chart_type = chart_type)
+                data = chart_renderer.get_filtered_data(sessions, chart_options)
+                def render():
+                    fig = chart_renderer.create_figure()
+                    chart_renderer.plot_chart(fig.add_subplot(111), data, chart_options)
+                    fig.canvas.draw()
+                run_benchmark(results, name, render, repeat)
+
+    if is_selected("custom_monthy_chart/read_csv"):
+        # The module shows its chart when it is run, it is only imported here
+        import custom_monthy_chart
+        custom_monthy_chart.DATA_FILE = os.path.join(folder, "data.csv")
+        run_benchmark(results, "custom_monthy_chart/read_csv", custom_monthy_chart.read_csv, repeat)
+
+    return {"options": options._asdict(), "dataset": dataset, "environment": get_environment(), "results": results}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description = "Benchmark the extraction, parsing, filtering and rendering of a generated server and save the results as JSON.")
+    parser.add_argument("--players", type = int, default = BENCHMARK_SUITE_PLAYERS, help = "number of players of the generated server")
+    parser.add_argument("--days", type = int, default = BENCHMARK_SUITE_DAYS, help = "number of days of logs")
+    parser.add_argument("--sessions-per-day", type = int, default = BENCHMARK_SUITE_SESSIONS_PER_DAY, help = "play sessions started every day, before the overlapping sessions of a player are dropped")
+    parser.add_argument("--crash-rate", type = float, default = BENCHMARK_SUITE_CRASH_RATE, help = "average number of server crashes per day")
+    parser.add_argument("--noise-ratio", type = float, default = BENCHMARK_SUITE_NOISE_RATIO, help = "chat and server lines written for every join or left line")
+    parser.add_argument("--seed", type = int, default = 0, help = "seed of the generator, the same seed and scale always generate the same files")
+    parser.add_argument("--repeat", type = int, default = BENCHMARK_REPEAT, help = "timed runs of every benchmark")
+    parser.add_argument("--only", action = "append", metavar = "NAME", help = "only run the benchmarks whose name starts with NAME, can be repeated (e.g. parse, render/full)")
+    parser.add_argument("--folder", help = "folder the dataset is generated in and kept (default: a temporary folder)")
+    parser.add_argument("--output", default = BENCHMARK_OUTPUT, help = "JSON file the results are written to")
+    parser.add_argument("--comparisons", action = "store_true", help = "run the before and after comparisons of past optimizations instead of the suite")
+    return parser.parse_args()
+
+# Before and after comparisons of past optimizations
+def run_comparisons():
+    benchmark_import_time()
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "players.txt")
+        generate_players_file(path)
+        benchmark_timestamp_parser(path, BENCHMARK_LINES)
+    with tempfile.TemporaryDirectory() as folder:
+        generate_server_logs(folder, 1, BENCHMARK_LINES)
+        benchmark_line_classifier(os.path.join(folder, os.listdir(folder)[0]), BENCHMARK_LINES)
+    benchmark_extraction_memory()
+    benchmark_gantt_rendering()
+    benchmark_events_file()
+    benchmark_wide_range()
+    benchmark_servers()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.comparisons:
+        run_comparisons()
+    else:
+        options = GeneratorOptions(args.players, args.days, args.sessions_per_day, args.crash_rate, args.noise_ratio, args.seed)
+        if args.folder:
+            os.makedirs(args.folder, exist_ok = True)
+            report = run_suite(args.folder, options, args.repeat, args.only)
+        else:
+            with tempfile.TemporaryDirectory() as folder:
+                report = run_suite(folder, options, args.repeat, args.only)
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent = 2)
+        print(f"Results saved to {args.output}")
@@ -0,0 +1,99 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time
+
+import profiler
+from chart_renderer import CHART_TYPES, DISPLAY_HEAD, DISPLAY_NAME, DISPLAY_NAME_AND_HEAD, ChartOptions, create_figure, get_filtered_data, player_images, plot_chart, prefetch_player_images
+from player_data import ALL_SERVERS, DATE_FORMAT, FILTER_DAY_PLAYED, FILTER_TIME_PLAYED, SORT_NAME, SORT_PLAY_DAY, SORT_PLAY_FIRST, SORT_PLAY_LAST, SORT_PLAY_TIME, parse_data
+
+# Constants
+EXPORT_FOLDER = "./export"
+EXPORT_FORMATS = ["png", "svg"]
+# Number of processes rendering charts in parallel, None uses every core
+PROCESSES = None
+# Charts are selected on the command line by their name in lower case with dashes, e.g. play-sessions
+CHART_NAMES = {chart_type.lower().replace(" ", "-"): chart_type for chart_type in CHART_TYPES}
+
+# Sessions loaded once by the main process and given to every rendering process when it starts
+sessions = None
+
+def init_worker(worker_sessions, missing_player_images = None, profile_mode = None):
+    global sessions
+    sessions = worker_sessions
+    profiler.set_mode(profile_mode)
+    # Heads that could not be downloaded by the main process are not downloaded again by every process
+    player_images.missing.update(missing_player_images or {})
+
+def get_export_path(folder, options, export_format):
+    chart_name = options.chart_type.lower().replace(" ", "-") + (f"_{options.server}" if options.server != ALL_SERVERS else "")
+    return os.path.join(folder, f"{chart_name}_{options.start_date.strftime('%Y-%m-%d')}_{options.end_date.strftime('%Y-%m-%d')}.{export_format}")
+
+# Render a chart to a file, returns the path and the time spent in every stage, or None and the error of a chart that failed
+def export_chart(options, path):
+    refresh = profiler.start(f"{options.chart_type} {options.start_date.strftime(DATE_FORMAT)} - {options.end_date.strftime(DATE_FORMAT)}")
+    try:
+        filtered_data = get_filtered_data(sessions, options)
+        fig = create_figure()
+        plot_chart(fig.add_subplot(111), filtered_data, options)
+        with profiler.span("save"):
+            fig.savefig(path)
+    except Exception as e:
+        # The other charts are still exported
+        refresh.stop_capture()
+        return None, f"Chart {refresh.name} could not be exported.\nError: {e}"
+    return path, profiler.finish(refresh)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description = "Render the player activity charts to files without opening the application.")
+    parser.add_argument("--chart", action = "append", choices = list(CHART_NAMES), help = "chart to render, can be repeated (default: every chart)")
+    parser.add_argument("--range", action = "append", nargs = 2, metavar = ("FROM", "TO"), help = f"date range to render, in the {DATE_FORMAT.replace('%', '')} format, can be repeated (default: every date)")
+    parser.add_argument("--format", choices = EXPORT_FORMATS, default = EXPORT_FORMATS[0], help = "file format of the charts")
+    parser.add_argument("--output", default = EXPORT_FOLDER, help = "folder the charts are written to")
+    parser.add_argument("--display", choices = [DISPLAY_NAME, DISPLAY_HEAD, DISPLAY_NAME_AND_HEAD], default = DISPLAY_NAME_AND_HEAD, help = "player representation")
+    parser.add_argument("--sort", choices = [SORT_NAME, SORT_PLAY_FIRST, SORT_PLAY_LAST, SORT_PLAY_TIME, SORT_PLAY_DAY], default = SORT_NAME, help = "player order")
+    parser.add_argument("--reverse", action = "store_true", help = "reverse the player order")
+    parser.add_argument("--filter-type", choices = [FILTER_TIME_PLAYED, FILTER_DAY_PLAYED], default = FILTER_TIME_PLAYED, help = "value the players are filtered on")
+    parser.add_argument("--filter-min", type = float, default = 0, help = "minimum filtered value, 0 to disable")
+    parser.add_argument("--filter-max", type = float, default = 0, help = "maximum filtered value, 0 to disable")
+    parser.add_argument("--server", default = ALL_SERVERS, help = "server the charts are rendered for, a subfolder of the data folder or a server of the servers file (default: every server)")
+    parser.add_argument("--processes", type = int, default = PROCESSES, help = "number of processes rendering charts (default: every core)")
+    parser.add_argument("--profile", choices = profiler.PROFILE_MODES, default = profiler.mode, help = f"capture every chart with cProfile or tracemalloc, also set by the {profiler.PROFILE_ENV} environment variable")
+    return parser.parse_args()
+
+def print_results(results):
+    for path, summary in results:
+        print(f"Exported {path} - {summary}" if path else summary)
+
+# Render every requested chart for every requested date range
+def export_charts():
+    args = parse_args()
+    data, min_date, max_date = parse_data()
+    if min_date is None:
+        print("No data found")
+        return
+    if args.server != ALL_SERVERS and args.server not in data.servers:
+        print(f"Unknown server '{args.server}', use one of {', '.join(data.servers)}.")
+        return
+
+    date_ranges = [(datetime.combine(datetime.strptime(start, DATE_FORMAT).date(), time.min), datetime.combine(datetime.strptime(end, DATE_FORMAT).date(), time.max)) for start, end in args.range] if args.range else [(datetime.combine(min_date.date(), time.min), datetime.combine(max_date.date(), time.max))]
+    chart_types = [CHART_NAMES[chart] for chart in args.chart] if args.chart else CHART_TYPES
+    charts = [ChartOptions(start_date, end_date, chart_type, args.display, args.sort, args.reverse, args.filter_type, args.filter_min, args.filter_max, args.server) for start_date, end_date in date_ranges for chart_type in chart_types]
+
+    # Heads are downloaded and new players given a color once here, the rendering processes then read them from the cache folder
+    for server_sessions in [data] + list(data.servers.values()):
+        server_sessions.get_colors()
+    init_worker(data, None, args.profile)
+    for options in charts:
+        prefetch_player_images(get_filtered_data(data, options), options)
+
+    os.makedirs(args.output, exist_ok = True)
+    paths = [get_export_path(args.output, options, args.format) for options in charts]
+    if args.processes == 1 or len(charts) <= 1:
+        print_results(export_chart(options, path) for options, path in zip(charts, paths))
+    else:
+        with ProcessPoolExecutor(args.processes, initializer = init_worker, initargs = (data, player_images.missing, args.profile)) as executor:
+            print_results(executor.map(export_chart, charts, paths))
+
+if __name__ == "__main__":
+    export_charts()
@@ -0,0 +1,266 @@
+import matplotlib.dates as mdates
+import numpy as np
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.colors import to_rgba
+from matplotlib.offsetbox import AnnotationBbox, OffsetImage
+from matplotlib.patches import Patch
+
+from chart_renderer import DISPLAY_HEAD, DISPLAY_NAME, DISPLAY_NAME_AND_HEAD, LINE_CHART_BUCKET_PIXELS, LINE_CHART_BUCKETS, PLAYER_IMAGE_ZOOM, get_player_label, player_images
+from player_data import SECONDS_PER_DAY, SECONDS_PER_HOUR, to_datetime64, to_seconds, trim_zeros
+
+# Head image of a player resized once to the size it is drawn at, instead of resampling the full image on every draw
+def get_player_offset_image(player, dpi):
+    image = player_images.get_image(player)
+    if image is None:
+        return None
+    size = max(1, round(image.width * PLAYER_IMAGE_ZOOM * dpi / 72))
+    return OffsetImage(player_images.get_thumbnail(player, size), zoom = 72 / dpi)
+
+# Empty chart of a date range without sessions, or whose players are all filtered out
+def plot_no_data(ax, title):
+    ax.set_title(title)
+    ax.text(0.5, 0.5, "No data", ha = "center", va = "center", fontsize = 14, color = "gray", transform = ax.transAxes)
+    ax.set_xticks([])
+    ax.set_yticks([])
+
+# Bucket of every time in seconds since EPOCH, weeks start on monday
+def get_buckets(seconds, bucket):
+    if bucket == "hour":
+        return seconds // SECONDS_PER_HOUR
+    if bucket == "day":
+        return seconds // SECONDS_PER_DAY
+    if bucket == "week":
+        return (seconds // SECONDS_PER_DAY + 3) // 7
+    return to_datetime64(seconds).astype("datetime64[M]").astype(np.int64)
+
+# Level of detail of a line chart, the values of the finest bucket are kept if they fit in the width of the axes,
+# otherwise only the lowest and highest value of every coarser bucket are kept so the peaks stay visible
+# Returns the kept times and values and the bucket they were reduced to, or None if every value is kept
+def downsample(ax, seconds, values, finest):
+    max_buckets = ax.get_window_extent().width / LINE_CHART_BUCKET_PIXELS
+    bucket = finest
+    if len(seconds):
+        for bucket in LINE_CHART_BUCKETS[LINE_CHART_BUCKETS.index(finest):]:
+            first, last = get_buckets(seconds[[0, -1]], bucket)
+            if last - first < max_buckets:
+                break
+    if bucket == finest:
+        return seconds, values, None
+    # Sort by bucket then value, the first and last value of every bucket are its lowest and highest
+    bucket_ids = get_buckets(seconds, bucket)
+    order = np.lexsort((values, bucket_ids))
+    first = np.flatnonzero(np.append(True, bucket_ids[order][1:] != bucket_ids[order][:-1]))
+    last = np.append(first[1:] - 1, len(order) - 1)
+    kept = np.unique(np.concatenate((order[first], order[last])))
+    return seconds[kept], values[kept], bucket
+
+# Chart plotting functions
+def plot_total_time_bar_chart(ax, data, options):
+    players = [player for player in data.players if data.total_played[player] > 0]
+    total_played_hours = [data.total_played[player] / 60 for player in players]  # Convert minutes to hours
+
+    ax.bar([get_player_label(data.get_name(player), options) for player in players], total_played_hours, color=[data.get_color(player) for player in players])
+
+    for player in players:
+        if options.display_mode in [DISPLAY_HEAD, DISPLAY_NAME_AND_HEAD]:
+            player_image = get_player_offset_image(data.get_name(player), ax.figure.dpi)
+            if player_image:
+                ax.add_artist(AnnotationBbox(player_image, (get_player_label(data.get_name(player), options), 0), frameon = False, box_alignment = (0.5, 1.5)))
+
+    if options.display_mode == DISPLAY_HEAD:
+        for label in ax.get_xticklabels():
+            label.set_color(to_rgba("white", 0))
+
+    ax.set_title("Time played by player")
+    ax.set_xlabel("Players")
+    ax.set_ylabel("Time played (hours)")
+    ax.tick_params(axis = 'x', rotation = 45 if options.display_mode == DISPLAY_NAME else 90)
+
+def plot_hourly_active_players_line_chart(ax, data, options):
+    min_hour, max_hour = to_seconds(options.start_date) // SECONDS_PER_HOUR, to_seconds(options.end_date) // SECONDS_PER_HOUR
+
+    hours = np.arange(min_hour, max_hour + 1) * SECONDS_PER_HOUR
+    active_players = data.get_hourly_active_players()
+
+    # Remove empty values at the beginning and end
+    valid = trim_zeros(active_players)
+    hours, active_players, bucket = downsample(ax, hours[valid], active_players[valid], "hour")
+    hours = to_datetime64(hours)
+
+    ax.plot(hours, active_players, color='blue', alpha=0.7)
+    ax.fill_between(hours, active_players, color='lightblue', alpha=0.5)
+    ax.set_title("Hourly active players" + (f" (lowest and highest of every {bucket})" if bucket else ""))
+    ax.set_xlabel("Hour")
+    ax.set_ylabel("Number of active players")
+    ax.xaxis.set_major_formatter(mdates.DateFormatter("%d/%m/%y %H:%M"))
+    ax.tick_params(axis = 'x', rotation = 45)
+
+def plot_daily_active_players_line_chart(ax, data, options):
+    min_day, max_day = to_seconds(options.start_date) // SECONDS_PER_DAY, to_seconds(options.end_date) // SECONDS_PER_DAY
+    daily_active_counts = data.get_daily_active_players()
+
+    valid = trim_zeros(daily_active_counts)
+    dates, active_counts, bucket = downsample(ax, (np.arange(min_day, max_day + 1) * SECONDS_PER_DAY)[valid], daily_active_counts[valid], "day")
+    dates = to_datetime64(dates)
+
+    ax.plot(dates, active_counts, color="blue", alpha=0.7)
+    ax.fill_between(dates, active_counts, color="lightblue", alpha=0.5)
+    # A marker per day is only drawn while every day is shown
+    if bucket is None:
+        ax.scatter(dates, active_counts, color="blue", s=50, label="Player count")
+    ax.set_title("Daily active players" + (f" (lowest and highest of every {bucket})" if bucket else ""))
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Number of active players")
+    ax.xaxis.set_major_formatter(mdates.DateFormatter("%d/%m/%y"))
+    ax.xaxis.set_major_locator(mdates.AutoDateLocator())
+    ax.tick_params(axis = 'x', rotation = 45)
+
+def plot_gantt_chart_time(ax, data, options):
+    sessions = data.get_sessions()
+    players = [player for player in data.players if data.session_count[player]]
+    if not players:
+        return plot_no_data(ax, "Play sessions")
+    plot_gantt_bars(ax, data, options, players, sessions.player, mdates.date2num(to_datetime64(sessions.start)), mdates.date2num(to_datetime64(sessions.end)))
+    ax.set_title("Play sessions")
+
+def plot_gantt_chart_day(ax, data, options):
+    day_player, day = data.get_days_played()
+    players = [player for player in data.players if data.day_count[player]]
+    if not players:
+        return plot_no_data(ax, "Active days")
+    plot_gantt_bars(ax, data, options, players, day_player, mdates.date2num(to_datetime64(day * SECONDS_PER_DAY)), mdates.date2num(to_datetime64((day + 1) * SECONDS_PER_DAY)))
+    ax.set_title("Active days")
+
+# Corners of the rectangles of a PolyCollection, one rectangle per value of the coordinate arrays
+def get_rectangles(left, right, lower, upper):
+    return np.stack([np.column_stack((left, lower)), np.column_stack((left, upper)), np.column_stack((right, upper)), np.column_stack((right, lower))], axis = 1)
+
+def plot_gantt_bars(ax, data, options, players, player, left, right):
+    # Days of the chart, a session can go on through the whole range without starting or ending in it
+    day_player, day = data.get_days_played()
+    sessions = data.get_sessions()
+    days = np.concatenate((day, sessions.start // SECONDS_PER_DAY, np.maximum(sessions.end - 1, sessions.start) // SECONDS_PER_DAY))
+    dates = mdates.date2num(to_datetime64(np.arange(days.min(), days.max() + 2) * SECONDS_PER_DAY))
+
+    # Every bar of every player is drawn as a single collection instead of one artist per bar
+    rows = np.full(len(data.sessions.players), -1)
+    rows[players] = np.arange(len(players))
+    shown = rows[player] >= 0
+    left, right, lower, upper = left[shown], right[shown], rows[player[shown]] - 0.4, rows[player[shown]] + 0.4
+    colors = np.array([data.get_color(player) for player in range(len(data.sessions.players))])
+    ax.add_collection(PolyCollection(get_rectangles(left, right, lower, upper), facecolors = colors[player[shown]], linewidths = 0), autolim = False)
+    # Day gridlines span the whole height of the chart whatever the number of players
+    ax.add_collection(LineCollection([[(date, 0), (date, 1)] for date in dates], colors = "gray", linestyles = "-", linewidths = 0.5, transform = ax.get_xaxis_transform()), autolim = False)
+
+    for i, player in enumerate(players):
+        if options.display_mode in [DISPLAY_HEAD, DISPLAY_NAME_AND_HEAD]:
+            player_image = get_player_offset_image(data.get_name(player), ax.figure.dpi)
+            if player_image:
+                ax.add_artist(AnnotationBbox(player_image, (dates[0], i), frameon = False, box_alignment = (1.5, 0.5)))
+    ax.set_yticks(range(len(players)), [get_player_label(data.get_name(player), options) for player in players])
+
+    if options.display_mode == DISPLAY_HEAD:
+        for label in ax.get_yticklabels():
+            label.set_color(to_rgba("white", 0))
+
+    ax.xaxis_date()
+    ax.update_datalim([(dates[0], -0.4), (dates[-1], len(players) - 0.6)])
+    ax.autoscale_view()
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Players")
+    ax.set_xlim(dates[0], dates[-1])
+    ax.xaxis.set_major_formatter(mdates.DateFormatter("%d/%m/%y"))
+    ax.xaxis.set_major_locator(mdates.AutoDateLocator())
+    ax.tick_params(axis='x', rotation=45)
+
+def plot_daily_play_time_stacked_bar_chart(ax, data, options):
+    players = [player for player in data.players if data.session_count[player]]
+    plot_daily_play_time(ax, data, players, "Daily play time", lambda first_day, day_count: data.get_play_time_matrix(players, first_day, day_count), [data.get_name(player) for player in players], [data.get_color(player) for player in players])
+
+def plot_daily_server_play_time_stacked_bar_chart(ax, data, options):
+    # Servers are drawn in the colors of the default color cycle
+    plot_daily_play_time(ax, data, data.players, "Daily play time per server", data.get_server_play_time_matrix, list(data.store.servers), [f"C{i}" for i in range(len(data.store.servers))])
+
+# Stack the daily play time of the players given by get_minutes(first_day, day_count) over the days they played on
+# A session going on through the whole range is played on days it neither starts nor ends on, so the days come from the play time
+def plot_daily_play_time(ax, data, players, title, get_minutes, labels, colors):
+    displayed = np.zeros(len(data.sessions.players), dtype = bool)
+    displayed[players] = True
+    played = displayed[data.play_time_player] & (data.play_time > 0)
+    if not played.any():
+        return plot_no_data(ax, title)
+    min_day = max(data.play_time_day[played].min(), data.start_date // SECONDS_PER_DAY)
+    max_day = min(data.play_time_day[played].max(), data.end_date // SECONDS_PER_DAY)
+    minutes = get_minutes(min_day, max_day - min_day + 1)
+    days = trim_zeros(minutes.sum(axis = 0))
+    if days.start == days.stop:
+        return plot_no_data(ax, title)
+    plot_stacked_bars(ax, min_day + days.start, minutes[:, days] / 60, labels, colors)
+    ax.set_title(title)
+
+# Stack the hours of every row of a rows x days matrix starting on first_day, every row is drawn as a single collection of bars instead of one artist per bar
+def plot_stacked_bars(ax, first_day, hours, labels, colors):
+    dates = mdates.date2num(to_datetime64(np.arange(first_day, first_day + hours.shape[1]) * SECONDS_PER_DAY))
+    bottom = np.zeros(len(dates))
+    legend = []
+    for row, label, color in zip(hours, labels, colors):
+        played = row > 0
+        ax.add_collection(PolyCollection(get_rectangles(dates[played] - 0.4, dates[played] + 0.4, bottom[played], bottom[played] + row[played]), color = color), autolim = False)
+        # A space is added because labels starting with an underscore are not shown
+        legend.append(Patch(color = color, label = rf" {label}"))
+        bottom += row
+
+    ax.xaxis_date()
+    ax.update_datalim([(dates[0] - 0.4, 0), (dates[-1] + 0.4, bottom.max())])
+    ax.autoscale_view()
+    ax.set_ylim(bottom = 0)
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Total play time (hours)")
+    ax.legend(handles = legend, loc = "upper right")
+    ax.xaxis.set_major_formatter(mdates.DateFormatter("%d/%m/%y"))
+    ax.xaxis.set_major_locator(mdates.AutoDateLocator())
+    ax.tick_params(axis='x', rotation=45)
+
+def plot_total_time_pie_chart(ax, data, options):
+    players = [player for player in data.players if data.total_played[player] > 0]
+    total_played_hours = [data.total_played[player] / 60 for player in players]  # Convert minutes to hours
+    names = [data.get_name(player) for player in players]
+    if not players:
+        return plot_no_data(ax, "Play time distribution")
+
+    ax.set_title("Play time distribution")
+    wedges, texts, junk = ax.pie(total_played_hours, labels = names if options.display_mode == DISPLAY_NAME else [("" if options.display_mode == DISPLAY_HEAD else ((" " * 4) + name + (" " * 4))) for name in names], autopct = (lambda val: str(round(val / 100 * sum(total_played_hours))) + "H"), startangle = 90, colors = [data.get_color(player) for player in players])
+    # Add images next to each label
+    if options.display_mode in [DISPLAY_HEAD, DISPLAY_NAME_AND_HEAD]:
+        for i, name in enumerate(names):
+            player_image = get_player_offset_image(name, ax.figure.dpi)
+            if player_image:
+                # Calculate position for annotation based on wedge angle
+                angle = (wedges[i].theta2 - wedges[i].theta1) / 2. + wedges[i].theta1
+                x = np.cos(np.radians(angle)) * 1.1
+                y = np.sin(np.radians(angle)) * 1.1
+                # Add image next to label
+                ab = AnnotationBbox(player_image, (x, y), frameon = False, box_alignment = (0.5, 0.5))
+                ax.add_artist(ab)
+
+def plot_active_days_pie_chart(ax, data, options):
+    players = [player for player in data.players if data.day_count[player]]
+    active_days_count = [data.day_count[player] for player in players]
+    names = [data.get_name(player) for player in players]
+    if not players:
+        return plot_no_data(ax, "Active days distribution")
+
+    ax.set_title("Active days distribution")
+    wedges, texts, junk = ax.pie(active_days_count, labels = names if options.display_mode == DISPLAY_NAME else [("" if options.display_mode == DISPLAY_HEAD else ((" " * 4) + name + (" " * 4))) for name in names], autopct = (lambda val: round(val / 100 * sum(active_days_count))), startangle = 90, colors = [data.get_color(player) for player in players])
+    # Add images next to each label
+    if options.display_mode in [DISPLAY_HEAD, DISPLAY_NAME_AND_HEAD]:
+        for i, name in enumerate(names):
+            player_image = get_player_offset_image(name, ax.figure.dpi)
+            if player_image:
+                # Calculate position for annotation based on wedge angle
+                angle = (wedges[i].theta2 - wedges[i].theta1) / 2. + wedges[i].theta1
+                x = np.cos(np.radians(angle)) * 1.1
+                y = np.sin(np.radians(angle)) * 1.1
+                # Add image next to label
+                ab = AnnotationBbox(player_image, (x, y), frameon = False, box_alignment = (0.5, 0.5))
+                ax.add_artist(ab)
@@ -0,0 +1,191 @@
+import os
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from io import BytesIO
+from threading import Lock
+from time import monotonic
+
+import profiler
+from player_data import ALL_SERVERS, CACHE_FOLDER, filter_data, sort_data, to_seconds
+
+# Constants
+PLAYER_IMAGE_URL = os.environ.get("PLAYER_IMAGE_URL", "https://mc-heads.net/avatar/{}")
+# Player images downloaded at once, seconds before a download is abandoned and before a missing image is downloaded again
+PLAYER_IMAGE_WORKERS = 8
+PLAYER_IMAGE_TIMEOUT = 10
+PLAYER_IMAGE_RETRY_DELAY = 60 * 60
+# Number of decoded player images and of resized player images kept in memory
+PLAYER_IMAGE_CACHE_SIZE = 512
+PLAYER_IMAGE_ZOOM = 0.1
+DISPLAY_NAME = "NAME"
+DISPLAY_HEAD = "HEAD"
+DISPLAY_NAME_AND_HEAD = "BOTH"
+GRAPH_BAR_PLAY_TIME = "Total time played"
+GRAPH_LINE_PLAYER_HOUR = "Hourly active players"
+GRAPH_LINE_PLAYER_DAY = "Daily active players"
+GRAPH_GANTT_PLAY_TIME = "Play sessions"
+GRAPH_GANTT_PLAY_DAY = "Active days"
+GRAPH_STACK_BAR_PLAY_TIME = "Daily play time"
+GRAPH_STACK_BAR_SERVER_PLAY_TIME = "Daily play time per server"
+GRAPH_PIE_PLAY_TIME = "Play time distribution"
+GRAPH_PIE_PLAY_DAY = "Active days distribution"
+CHART_TYPES = [GRAPH_GANTT_PLAY_TIME, GRAPH_GANTT_PLAY_DAY, GRAPH_LINE_PLAYER_HOUR, GRAPH_LINE_PLAYER_DAY, GRAPH_STACK_BAR_PLAY_TIME, GRAPH_STACK_BAR_SERVER_PLAY_TIME, GRAPH_BAR_PLAY_TIME, GRAPH_PIE_PLAY_TIME, GRAPH_PIE_PLAY_DAY]
+# Charts showing the head of the players
+HEAD_CHART_TYPES = [GRAPH_GANTT_PLAY_TIME, GRAPH_GANTT_PLAY_DAY, GRAPH_BAR_PLAY_TIME, GRAPH_PIE_PLAY_TIME, GRAPH_PIE_PLAY_DAY]
+CHART_SIZE = (18, 8)
+# Horizontal pixels of every bucket of the downsampled line charts, a bucket keeps its lowest and highest value so a line keeps about one point per pixel
+LINE_CHART_BUCKET_PIXELS = 2
+# Buckets of the line charts from the finest to the coarsest, the finest one that fits in the width of the axes is used
+LINE_CHART_BUCKETS = ["hour", "day", "week", "month"]
+
+# Options selected when a chart is requested, the server is one of the servers of the sessions or every server
+ChartOptions = namedtuple("ChartOptions", ["start_date", "end_date", "chart_type", "display_mode", "sort_mode", "sort_reverse", "filter_type", "filter_min", "filter_max", "server"], defaults = [ALL_SERVERS])
+
+# Download, cache and resize the head images of players, shared by the chart worker thread and the interface
+class PlayerImages:
+    def __init__(self, url = PLAYER_IMAGE_URL, folder = CACHE_FOLDER, workers = PLAYER_IMAGE_WORKERS, timeout = PLAYER_IMAGE_TIMEOUT, cache_size = PLAYER_IMAGE_CACHE_SIZE):
+        self.url = url
+        self.folder = folder
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self.executor = ThreadPoolExecutor(max_workers = workers)
+        self.lock = Lock()
+        # Decoded images and their resized versions, the least recently used ones are evicted first
+        self.images = OrderedDict()
+        self.thumbnails = OrderedDict()
+        # Downloads in progress and time of the last failed download of each player
+        self.pending = {}
+        self.missing = {}
+
+    def get_path(self, player):
+        return os.path.join(self.folder, f"{player}.png")
+
+    def remember(self, cache, key, image):
+        with self.lock:
+            cache[key] = image
+            cache.move_to_end(key)
+            while len(cache) > self.cache_size:
+                cache.popitem(last = False)
+        return image
+
+    def is_missing(self, player):
+        return monotonic() - self.missing.get(player, -PLAYER_IMAGE_RETRY_DELAY) < PLAYER_IMAGE_RETRY_DELAY
+
+    def download(self, player):
+        from urllib.request import urlopen
+        from PIL import Image
+        try:
+            image_url = self.url.format(player)
+            image_byt = urlopen(image_url, timeout = self.timeout).read()
+            image = Image.open(BytesIO(image_byt))
+            image.load()
+            os.makedirs(self.folder, exist_ok = True)
+            image.save(self.get_path(player), "PNG")
+            print(f"Generated cache image for player '{player}'.")
+            profiler.count("images downloaded")
+            return self.remember(self.images, player, image)
+        except Exception as e:
+            print(f"Image for player '{player}' not found.\nError: {e}")
+            profiler.count("images missing")
+            # Missing players are not downloaded again on every redraw
+            self.missing[player] = monotonic()
+            return None
+        finally:
+            with self.lock:
+                self.pending.pop(player, None)
+
+    # Start the download of a player image unless it is already available, downloading or known to be missing
+    def request(self, player):
+        with self.lock:
+            if player in self.images:
+                self.images.move_to_end(player)
+                return self.images[player]
+            if player in self.pending:
+                return self.pending[player]
+        if self.is_missing(player):
+            return None
+        if os.path.exists(self.get_path(player)):
+            from PIL import Image
+            image = Image.open(self.get_path(player))
+            image.load()
+            profiler.count("images read")
+            return self.remember(self.images, player, image)
+        with self.lock:
+            if player not in self.pending:
+                self.pending[player] = self.executor.submit(self.download, player)
+            return self.pending[player]
+
+    # Download every missing image at once instead of one after the other while a chart is plotted
+    def prefetch(self, players):
+        downloads = [download for download in [self.request(player) for player in players] if isinstance(download, Future)]
+        wait(downloads)
+
+    def get_image(self, player):
+        image = self.request(player)
+        return image.result() if isinstance(image, Future) else image
+
+    def get_thumbnail(self, player, size):
+        with self.lock:
+            if (player, size) in self.thumbnails:
+                self.thumbnails.move_to_end((player, size))
+                return self.thumbnails[(player, size)]
+        image = self.get_image(player)
+        if image is None:
+            return None
+        return self.remember(self.thumbnails, (player, size), image.resize((size, size)))
+
+player_images = PlayerImages()
+
+def get_player_label(player, options):
+    return player + (" " * (8 if options.display_mode == DISPLAY_NAME_AND_HEAD else 0))
+
+def get_filtered_data(sessions, options):
+    with profiler.span("filter"):
+        sessions = sessions.get_server(options.server)
+        start_date, end_date = to_seconds(options.start_date), to_seconds(options.end_date)
+        filtered_data = filter_data(sessions, start_date, end_date, options.filter_type, options.filter_min, options.filter_max, sessions.get_revision(end_date))
+        return sort_data(filtered_data, options.sort_mode, options.sort_reverse)
+
+# Download the heads shown by a chart at once before it is plotted
+def prefetch_player_images(data, options):
+    if options.display_mode in [DISPLAY_HEAD, DISPLAY_NAME_AND_HEAD] and options.chart_type in HEAD_CHART_TYPES:
+        with profiler.span("images"):
+            player_images.prefetch([data.get_name(player) for player in data.players if data.session_count[player]])
+
+# Create an off-screen figure, it does not depend on the matplotlib backend selected by the application
+# matplotlib is only imported when the first chart is drawn
+def create_figure():
+    with profiler.span("figure"):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        fig = Figure(figsize = CHART_SIZE)
+        FigureCanvasAgg(fig)
+        return fig
+
+def plot_chart(ax, data, options):
+    with profiler.span("plot"):
+        plot_chart_type(ax, data, options)
+    profiler.count("artists", len(ax.get_children()))
+
+def plot_chart_type(ax, data, options):
+    from chart_plots import plot_active_days_pie_chart, plot_daily_active_players_line_chart, plot_daily_play_time_stacked_bar_chart, plot_daily_server_play_time_stacked_bar_chart, plot_gantt_chart_day, plot_gantt_chart_time, plot_hourly_active_players_line_chart, plot_total_time_bar_chart, plot_total_time_pie_chart
+    # Chart selection logic
+    chart_type = options.chart_type
+    if chart_type == GRAPH_BAR_PLAY_TIME:
+        plot_total_time_bar_chart(ax, data, options)
+    elif chart_type == GRAPH_LINE_PLAYER_DAY:
+        plot_daily_active_players_line_chart(ax, data, options)
+    elif chart_type == GRAPH_LINE_PLAYER_HOUR:
+        plot_hourly_active_players_line_chart(ax, data, options)
+    elif chart_type == GRAPH_GANTT_PLAY_TIME:
+        plot_gantt_chart_time(ax, data, options)
+    elif chart_type == GRAPH_GANTT_PLAY_DAY:
+        plot_gantt_chart_day(ax, data, options)
+    elif chart_type == GRAPH_STACK_BAR_PLAY_TIME:
+        plot_daily_play_time_stacked_bar_chart(ax, data, options)
+    elif chart_type == GRAPH_STACK_BAR_SERVER_PLAY_TIME:
+        plot_daily_server_play_time_stacked_bar_chart(ax, data, options)
+    elif chart_type == GRAPH_PIE_PLAY_TIME:
+        plot_total_time_pie_chart(ax, data, options)
+    elif chart_type == GRAPH_PIE_PLAY_DAY:
+        plot_active_days_pie_chart(ax, data, options)
@@ -108,4 +108,5 @@ def show_chart(chart_type, show_select = True):
     elif show_select:
         return show_chart(select_from_list(AVAILABLE_GRAPH_TYPE, "Select a chart type"), False)
 
-show_chart(DEFAULT_TYPE)
+if __name__ == "__main__":
+    show_chart(DEFAULT_TYPE)
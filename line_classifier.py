@@ -0,0 +1,30 @@
+import re
+
+# Actions found in the log lines
+ACTION_JOINED = 'joined'
+ACTION_LEFT = 'left'
+ACTION_CRASH = 'crash'
+
+# Substrings that a line must contain to be worth matching, checked on the raw bytes before any regex
+SERVER_LOG_MARKERS = ((b' joined the game', ACTION_JOINED), (b' left the game', ACTION_LEFT), (b'crash report has been saved', ACTION_CRASH))
+# The lines of players.txt don't always end with "the game" and crashes are written as "left (server crash)"
+PLAYERS_FILE_MARKERS = ((b' joined', ACTION_JOINED), (b' left', ACTION_LEFT))
+
+# Define regex pattern for the target log format
+LOG_PATTERN = re.compile(rb'\[(\d{2}[A-Za-z]{3}\d{4} \d{2}:\d{2}:\d{2}\.\d{3})\] ?(\[.*\])?:? ?(([a-zA-Z0-9_]{1,20}) (joined|left) the game)')
+CRASH_PATTERN = re.compile(rb'\[(\d{2}[A-Za-z]{3}\d{4} \d{2}:\d{2}:\d{2}\.\d{3})\] ?(\[.*\])?:? ?This crash report has been saved to')
+PLAYER_PATTERN = re.compile(rb'\[(.*?)\] ([a-zA-Z0-9_]{1,20}) (joined|left)')
+
+# Return the action a line may contain, or None for the chat, world saves and mod noise that make most of a log
+def classify_line(line, markers = SERVER_LOG_MARKERS):
+    for marker, action in markers:
+        if marker in line:
+            return action
+    return None
+
+# Yield (action, line) for the lines that may contain an action
+def classify_lines(lines, markers = SERVER_LOG_MARKERS):
+    for line in lines:
+        action = classify_line(line, markers)
+        if action is not None:
+            yield action, line
@@ -1,73 +1,229 @@
 import gzip
+import hashlib
+import heapq
+import itertools
+import json
 import os
-import re
-from datetime import datetime
+import tempfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
 
-# Set the input folder and output file path
+from line_classifier import ACTION_CRASH, ACTION_JOINED, ACTION_LEFT, CRASH_PATTERN, LOG_PATTERN, classify_lines
+from player_data import DEFAULT_SERVER, EventsFileWriter, get_servers
+
+# Set the input folder and output file path, the archives of every subfolder are extracted into a file of the same name in that subfolder
 DATA_FOLDER = './data'
 OUTPUT_FILE = './data/players.txt'
+# Write the actions as 'text' lines in OUTPUT_FILE, or as 'binary' records in BINARY_OUTPUT_FILE that the main program reads without parsing them
+OUTPUT_FORMAT = 'text'
+BINARY_OUTPUT_FILE = './data/players.events'
+# Archives already extracted into the output file and players still connected at the end of them, the other servers have their own manifest next to it
+MANIFEST_FILE = './cache/log_extractor.json'
+# Number of processes reading archives in parallel, None uses every core
+PROCESSES = None
+# Maximum number of sorted archives merged at once, more archives are merged in several passes
+MERGE_FAN_IN = 256
+EPOCH = datetime(1970, 1, 1)
 
-# Define regex pattern for the target log format
-LOG_PATTERN = r'\[(\d{2}[A-Za-z]{3}\d{4} \d{2}:\d{2}:\d{2}\.\d{3})\] ?(\[.*\])?:? ?(([a-zA-Z0-9_]{1,20}) (joined|left) the game)'
-CRASH_PATTERN = r'\[(\d{2}[A-Za-z]{3}\d{4} \d{2}:\d{2}:\d{2}\.\d{3})\] ?(\[.*\])?:? ?This crash report has been saved to'
-
-# Collect all matching log lines in a list
-log_entries = []
-
-# Iterate over all files in the data folder
-for filename in os.listdir(DATA_FOLDER):
-    # Check if the file is a .tar.gz archive
-    if filename.endswith('.gz'):
-        archive_path = os.path.join(DATA_FOLDER, filename)
-
-        # Open the tar.gz archive
-        with gzip.open(archive_path, 'rt', encoding='utf-8') as archive:
-            # Read lines from the file
-            for line in archive:
-                line = line.strip()  # Decode and strip each line
-
-                # Match the line against the log pattern
-                match = re.match(LOG_PATTERN, line)
-                if match:
-                    # Extract date-time and action from the matched pattern
-                    date_str, server_info, player_action, player, action = match.groups()
-
-                    # Convert date format from DDMMMYYYY HH:mm:ss.SSS to DD/MM/YYYY HH:mm:ss
-                    date_obj = datetime.strptime(date_str, '%d%b%Y %H:%M:%S.%f')
-                    formatted_date = date_obj.strftime('%m/%d/%y %H:%M:%S')
-                    log_entries.append((date_obj, player, action, f"[{formatted_date}] {player_action}"))
-                else:
-                    match = re.match(CRASH_PATTERN, line)
-                    if match:
-                        # Extract date-time and action from the matched pattern
-                        date_str, server_info = match.groups()
-
-                        # Convert date format from DDMMMYYYY HH:mm:ss.SSS to DD/MM/YYYY HH:mm:ss
-                        date_obj = datetime.strptime(date_str, '%d%b%Y %H:%M:%S.%f')
-                        formatted_date = date_obj.strftime('%m/%d/%y %H:%M:%S')
-                        log_entries.append((date_obj, None, None, None))
-
-# Sort log entries by date (first element of each tuple)
-log_entries.sort(key=lambda entry: entry[0])
-
-if len(log_entries) > 0:
-    with open(OUTPUT_FILE, 'a') as output_file:
-        connected_players = []
-        for date, player, action, line in log_entries:
-            if player is None or action is None or line is None:
-                # Handle server crash
-                formatted_date = date.strftime('%m/%d/%y %H:%M:%S')
+# Folder of the archives of a server, file their actions are extracted into and manifest of the archives already extracted
+Target = namedtuple('Target', ['name', 'folder', 'output_file', 'manifest_file'])
+
+# Convert a DDMMMYYYY HH:mm:ss.SSS date to milliseconds since EPOCH, the start of every day is only parsed once
+def parse_log_date(date_str, days):
+    day, time_of_day = date_str.split(' ')
+    if day not in days:
+        days[day] = (datetime.strptime(day, '%d%b%Y') - EPOCH) // timedelta(milliseconds=1)
+    return days[day] + ((int(time_of_day[0:2]) * 60 + int(time_of_day[3:5])) * 60 + int(time_of_day[6:8])) * 1000 + int(time_of_day[9:12])
+
+def read_lines(archive_path):
+    # Open the tar.gz archive, lines are kept as bytes and only the matched parts are decoded
+    with gzip.open(archive_path, 'rb') as archive:
+        # Read lines from the file
+        for line in archive:
+            yield line.strip()
+
+# Read the actions of log lines as (milliseconds since EPOCH, action, player) entries
+def match_actions(classified_lines):
+    days = {}
+    for line_action, line in classified_lines:
+        if line_action == ACTION_CRASH:
+            match = CRASH_PATTERN.match(line)
+            if match:
+                # Extract date-time from the matched pattern
+                date_str, server_info = match.groups()
+                yield parse_log_date(date_str.decode('ascii'), days), ACTION_CRASH, None
+        else:
+            # Match the line against the log pattern
+            match = LOG_PATTERN.match(line)
+            if match:
+                # Extract date-time and action from the matched pattern
+                date_str, server_info, player_action, player, action = match.groups()
+                yield parse_log_date(date_str.decode('ascii'), days), action.decode('ascii'), player.decode('ascii')
+
+def write_entries_file(log_entries, path):
+    with open(path, 'w', encoding='utf-8') as entries_file:
+        for date, action, player in log_entries:
+            entries_file.write(f"{date}\t{action}\t{player or ''}\n")
+    return path
+
+def read_entries_file(path):
+    with open(path, 'r', encoding='utf-8') as entries_file:
+        for line in entries_file:
+            date, action, player = line.rstrip('\n').split('\t')
+            yield int(date), action, player or None
+
+# Sort the actions of an archive by date and save them in a temporary file, only one archive is kept in memory at a time
+def read_archive(archive_path, entries_path):
+    return write_entries_file(sorted(match_actions(classify_lines(read_lines(archive_path))), key=lambda entry: entry[0]), entries_path)
+
+def merge_entries_files(paths, temp_folder):
+    # Merge groups of files first when there are too many files to keep open at once
+    merge_pass = 0
+    while len(paths) > MERGE_FAN_IN:
+        merge_pass += 1
+        paths = [write_entries_file(heapq.merge(*[read_entries_file(path) for path in paths[i:i + MERGE_FAN_IN]], key=lambda entry: entry[0]), os.path.join(temp_folder, f"merge-{merge_pass}-{i}.txt")) for i in range(0, len(paths), MERGE_FAN_IN)]
+    return heapq.merge(*[read_entries_file(path) for path in paths], key=lambda entry: entry[0])
+
+def read_archives(archive_paths, temp_folder):
+    # Archives are independent so they are read in parallel, then their sorted actions are lazily merged by date
+    entries_paths = [os.path.join(temp_folder, f"archive-{i}.txt") for i in range(len(archive_paths))]
+    if PROCESSES == 1 or len(archive_paths) <= 1:
+        entries_paths = [read_archive(archive_path, entries_path) for archive_path, entries_path in zip(archive_paths, entries_paths)]
+    else:
+        with ProcessPoolExecutor(PROCESSES) as executor:
+            entries_paths = list(executor.map(read_archive, archive_paths, entries_paths, chunksize=max(1, len(archive_paths) // (4 * (PROCESSES or os.cpu_count() or 1)))))
+    return merge_entries_files(entries_paths, temp_folder)
+
+def format_log_date(date):
+    # Convert milliseconds since EPOCH to the MM/DD/YY HH:mm:ss format
+    return (EPOCH + timedelta(milliseconds=date)).strftime('%m/%d/%y %H:%M:%S')
+
+def get_archive_hash(archive_path):
+    with open(archive_path, 'rb') as archive:
+        return hashlib.file_digest(archive, 'blake2b').hexdigest()
+
+# Output file of a format, the servers other than the default one have it in their own folder
+def get_output_file(target = None, output_format = None):
+    output_file = BINARY_OUTPUT_FILE if (output_format or OUTPUT_FORMAT) == 'binary' else OUTPUT_FILE
+    return output_file if target is None or target.name == DEFAULT_SERVER else os.path.join(target.folder, os.path.basename(output_file))
+
+# Servers of the data folder, or of the servers file of the main program when it exists
+def get_targets():
+    targets = []
+    servers = get_servers(DATA_FOLDER)
+    for server in servers:
+        # The data folder itself is only extracted when it has archives or has no server subfolders
+        if server.name == DEFAULT_SERVER and len(servers) > 1 and not any(filename.endswith('.gz') for filename in os.listdir(server.folder)):
+            continue
+        manifest_file = MANIFEST_FILE if server.name == DEFAULT_SERVER else os.path.join(os.path.dirname(MANIFEST_FILE), f"log_extractor-{server.name}.json")
+        targets.append(Target(server.name, server.folder, get_output_file(server), manifest_file))
+    return targets
+
+def load_manifest(target):
+    if os.path.exists(target.manifest_file):
+        with open(target.manifest_file, 'r') as manifest_file:
+            manifest = json.load(manifest_file)
+        # The format of manifests written before it was recorded is the one of their output file
+        if "format" not in manifest:
+            manifest["format"] = 'binary' if os.path.exists(get_output_file(target, 'binary')) and not os.path.exists(get_output_file(target, 'text')) else 'text'
+        # Without its output file every archive must be extracted again
+        if os.path.exists(get_output_file(target, manifest["format"])):
+            return manifest
+    return {"archives": {}, "connected_players": [], "last_date": None, "format": OUTPUT_FORMAT}
+
+def save_manifest(manifest, target):
+    os.makedirs(os.path.dirname(target.manifest_file), exist_ok=True)
+    with open(target.manifest_file + '.tmp', 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.replace(target.manifest_file + '.tmp', target.manifest_file)
+
+def get_new_archives(manifest, folder):
+    new_archives = {}
+    # Iterate over all files in the data folder
+    for filename in sorted(os.listdir(folder)):
+        # Check if the file is a .gz archive
+        if filename.endswith('.gz'):
+            archive_path = os.path.join(folder, filename)
+            stat = os.stat(archive_path)
+            known = manifest["archives"].get(filename)
+            # An unchanged size and modification time are trusted without reading the archive
+            if known and known["size"] == stat.st_size and known["mtime"] == stat.st_mtime_ns:
+                continue
+            archive = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "hash": get_archive_hash(archive_path)}
+            if known and known["size"] == archive["size"] and known["hash"] == archive["hash"]:
+                manifest["archives"][filename] = archive
+                continue
+            # Its actions are already in the output file and cannot be told apart from the new ones, so it is not extracted again
+            if known:
+                print(f"Archive {filename} has changed since it was extracted and is skipped, remove the output file to extract every archive again.")
+                continue
+            new_archives[filename] = archive
+    return new_archives
+
+# Return the (player, action) entries of an action and keep track of the connected players
+def resolve_action(action, player, connected_players):
+    if action == ACTION_CRASH:
+        # Handle server crash, every connected player leaves the game
+        entries = [(connected_player, ACTION_LEFT) for connected_player in connected_players]
+        connected_players.clear()
+        return entries
+    if "join" in action and player not in connected_players:
+        connected_players.append(player)
+    elif "left" in action and player in connected_players:
+        connected_players.remove(player)
+    return [(player, action)]
+
+def write_log_entries(log_entries, connected_players, output_path):
+    count, first_date, last_date = 0, None, None
+    binary = OUTPUT_FORMAT == 'binary'
+    with EventsFileWriter(output_path) if binary else open(output_path, 'a') as output_file:
+        for date, action, player in log_entries:
+            formatted_date = format_log_date(date)
+            if action == ACTION_CRASH:
                 print(f"[{formatted_date}] Server crashed with {len(connected_players)} player connected")
-                for connected_player in connected_players:
-                    output_file.write(f"[{formatted_date}] {connected_player} left (server crash)\n")
-                connected_players.clear()
-            else:
-                output_file.write(f"{line}\n")
-                if "join" in action and player not in connected_players:
-                    connected_players.append(player)
-                elif "left" in action and player in connected_players:
-                    connected_players.remove(player)
-
-    print(f"{len(log_entries)} actions have been extracted into {OUTPUT_FILE}.")
-else:
-    print("No data found")
\ No newline at end of file
+            for entry_player, entry_action in resolve_action(action, player, connected_players):
+                if binary:
+                    output_file.append(entry_player, date // 1000, entry_action == ACTION_JOINED)
+                else:
+                    output_file.write(f"[{formatted_date}] {entry_player} {entry_action} {'(server crash)' if action == ACTION_CRASH else 'the game'}\n")
+            count += 1
+            first_date = date if first_date is None else first_date
+            last_date = date
+    return count, first_date, last_date
+
+# Extract the actions of the archives that were not extracted by a previous run
+def extract_server_logs(target):
+    manifest = load_manifest(target)
+    # The main program reads every output file, extracting the same archives in the other format would count their actions twice
+    if manifest["format"] != OUTPUT_FORMAT:
+        print(f"The archives of {target.folder} were extracted into {get_output_file(target, manifest['format'])}, set OUTPUT_FORMAT back to '{manifest['format']}' or remove that file to extract them again.")
+        return
+    new_archives = get_new_archives(manifest, target.folder)
+
+    with tempfile.TemporaryDirectory() as temp_folder:
+        # Stream all matching log lines sorted by date
+        log_entries = read_archives([os.path.join(target.folder, filename) for filename in new_archives], temp_folder)
+        first_entry = next(log_entries, None)
+
+        if first_entry is not None:
+            # Players still connected at the end of the previous run are carried over so crashes are handled correctly
+            connected_players = manifest["connected_players"]
+            count, first_date, last_date = write_log_entries(itertools.chain([first_entry], log_entries), connected_players, target.output_file)
+            if manifest["last_date"] is not None and first_date < manifest["last_date"]:
+                print(f"Some actions are older than the last extracted action, {target.output_file} is no longer in chronological order.")
+            manifest["last_date"] = max(last_date, manifest["last_date"] or last_date)
+            print(f"{count} actions have been extracted into {target.output_file}.")
+        else:
+            print(f"No data found in {target.folder}")
+
+    manifest["archives"].update(new_archives)
+    save_manifest(manifest, target)
+
+# Every server is extracted on its own, the archives of a server are still read in parallel
+def extract_logs():
+    for target in get_targets():
+        extract_server_logs(target)
+
+if __name__ == "__main__":
+    extract_logs()
@@ -1,148 +1,118 @@
-import os
-import re
+import argparse
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, time, timedelta
-from math import floor
+from math import ceil, floor
+from time import monotonic
 
-import distinctipy
 import tkinter as tk
-from io import BytesIO
 from tkinter import ttk
-from tkcalendar import DateEntry
-import matplotlib.dates as mdates
-from matplotlib import pyplot as plt
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import numpy as np
-import pandas as pd
-from dateutil import parser as date_parser
-from urllib.request import urlopen
-from PIL import Image, ImageTk
-from matplotlib.offsetbox import OffsetImage, AnnotationBbox
+
+import profiler
+from chart_renderer import CHART_TYPES, DISPLAY_HEAD, DISPLAY_NAME, DISPLAY_NAME_AND_HEAD, GRAPH_GANTT_PLAY_DAY, GRAPH_GANTT_PLAY_TIME, ChartOptions, create_figure, get_filtered_data, player_images, plot_chart, prefetch_player_images
+from player_data import ALL_SERVERS, DATE_FORMAT, FILTER_DAY_PLAYED, FILTER_TIME_PLAYED, SORT_NAME, SORT_PLAY_DAY, SORT_PLAY_FIRST, SORT_PLAY_LAST, SORT_PLAY_TIME, LogFollower, format_datetime, format_number, parse_data, to_datetime, to_seconds
 
 # Constants
-DATA_FOLDER = "./data"
-CACHE_FOLDER = "./cache"
-PLAYER_IMAGE_URL = "https://mc-heads.net/avatar/{}"
-TIME_FORMAT = "%d/%m/%Y %H:%M:%S"
-DATE_FORMAT = "%d/%m/%Y"
-DISPLAY_NAME = "NAME"
-DISPLAY_HEAD = "HEAD"
-DISPLAY_NAME_AND_HEAD = "BOTH"
-GRAPH_BAR_PLAY_TIME = "Total time played"
-GRAPH_LINE_PLAYER_HOUR = "Hourly active players"
-GRAPH_LINE_PLAYER_DAY = "Daily active players"
-GRAPH_GANTT_PLAY_TIME = "Play sessions"
-GRAPH_GANTT_PLAY_DAY = "Active days"
-GRAPH_STACK_BAR_PLAY_TIME = "Daily play time"
-GRAPH_PIE_PLAY_TIME = "Play time distribution"
-GRAPH_PIE_PLAY_DAY = "Active days distribution"
-SORT_NAME = "NAME"
-SORT_PLAY_FIRST = "FIRST"
-SORT_PLAY_LAST = "LAST"
-SORT_PLAY_TIME = "TIME"
-SORT_PLAY_DAY = "DAY"
-FILTER_TIME_PLAYED = "Time played (in hours)"
-FILTER_DAY_PLAYED = "Day played"
-
-# Parse and organize player data from files
-def parse_data():
-    player_data = {}
-    min_date, max_date = None, None
-
-    for filename in os.listdir(DATA_FOLDER):
-        filepath = os.path.join(DATA_FOLDER, filename)
-        if os.path.isfile(filepath) and not filepath.endswith(('.zip', '.tar', '.tar.gz', '.gz', '.rar')):
-            with open(filepath, "r") as file:
-                for line in file:
-                    match = re.match(r"\[(.*?)\] ([a-zA-Z0-9_]{1,20}) (joined|left)", line)
-                    if not match:
-                        continue
-                    timestamp, player, action = match.groups()
-                    date = date_parser.parse(timestamp)
-
-                    # Initialize player in dictionary if not exists
-                    if player not in player_data:
-                        player_data[player] = {
-                            "sessions": [],
-                            "dayPlayed": set(),
-                        }
-
-                    # Track sessions
-                    if "join" in action.lower():
-                        endSession(player_data, player, date)
-                        player_data[player]["sessions"].append({"start": date, "end": None})
-                    elif "left" in action.lower():
-                        endSession(player_data, player, date)
-
-                    # Update global min and max dates
-                    min_date = min(min_date, date) if min_date else date
-                    max_date = max(max_date, date) if max_date else date
-
-    colors = distinctipy.get_colors(len(player_data), pastel_factor = 0.25)
-    for i, player in enumerate(player_data):
-        player_data[player]["dayPlayed"] = sorted(player_data[player]["dayPlayed"])
-        player_data[player]["color"] = colors[i]
-        endSession(player_data, player, datetime.now())
-        if player_data[player]["sessions"]:
-            player_data[player]["sessions"] = sorted(player_data[player]["sessions"], key = lambda session: session["start"])
-
-    return player_data, min_date, max_date
-
-def endSession(player_data, player, date):
-    if player_data[player]["sessions"] and player_data[player]["sessions"][-1]["end"] is None:
-        session = player_data[player]["sessions"][-1]
-        session["end"] = date
-        session["duration"] = (session["end"] - session["start"]).total_seconds() / 60
-        player_data[player]["dayPlayed"].add(session["start"].date())
-        player_data[player]["dayPlayed"].add(session["end"].date())
-
-def format_datetime(datestr, timeofday = None, defaultdate = datetime.now()):
-    try:
-        return datetime.combine(datetime.strptime(datestr, DATE_FORMAT).date(), timeofday) if timeofday else datetime.strptime(datestr, DATE_FORMAT)
-    except ValueError:
-        return defaultdate
-
-def format_number(numstr, defaultvalue = 0):
-    try:
-       return float(numstr)
-    except ValueError:
-        return defaultvalue
-
-
-def trim_dictionary(data, empty_value):
-    # Convert dictionary to list of items (key-value pairs) for ordered processing
-    items = list(data.items())
-    # Find the first non-empty entry from the start
-    start = next((i for i, (_, v) in enumerate(items) if v != empty_value), None)
-    # Find the first non-empty entry from the end
-    end = next((i for i, (_, v) in enumerate(reversed(items)) if v != empty_value), None)
-    # Slice the items list based on the determined start and end indices if there are any non-empty values
-    return dict(items[start:len(items) - end]) if start is not None and end is not None else {}
-
-def get_player_image(player):
-    image_path = os.path.join(CACHE_FOLDER, f"{player}.png")
-    if os.path.exists(image_path):
-        return Image.open(image_path)
-    try:
-        image_url = PLAYER_IMAGE_URL.format(player)
-        image_byt = urlopen(image_url).read()
-        image = Image.open(BytesIO(image_byt))
-        os.makedirs(CACHE_FOLDER, exist_ok = True)
-        image.save(image_path, "PNG")
-        print(f"Generated cache image for player '{player}'.")
-        return image
-    except Exception as e:
-        print(f"Image for player '{player}' not found.\nError: {e}")
-        return None
+PLAYER_LIST_IMAGE_SIZE = 25
+# Detail columns of the player list and their width in pixels
+PLAYER_LIST_COLUMNS = [("First seen", 140), ("Last seen", 140), ("Total played", 90), ("Days played", 90), ("Sessions", 70), ("Average session", 110)]
+# Delay in milliseconds between two checks of the heads downloaded for the player list
+PLAYER_LIST_POLL_INTERVAL = 200
+# Delay in milliseconds between two checks of the chart rendered in the background
+CHART_POLL_INTERVAL = 50
+# Delay in milliseconds between two reads of the followed logs, and minimum delay in seconds between two refreshes of the chart they change
+FOLLOW_POLL_INTERVAL = 200
+FOLLOW_REFRESH_INTERVAL = 0.5
+
+def format_minutes(minutes):
+    return f"{floor(minutes / 60):.0f}H{minutes % 60:02.0f}"
+
+# Details of every player in a tree view, rows are not widgets so opening it stays fast with thousands of players
+# The heads are only loaded for the visible rows, when they are scrolled into view
+class PlayerList:
+    def __init__(self, window, data, display_mode):
+        self.window = window
+        self.show_heads = display_mode in [DISPLAY_HEAD, DISPLAY_NAME_AND_HEAD]
+        # Head images of the rows, tkinter does not keep a reference to the images of a tree view
+        self.images = {}
+        self.poll = None
+
+        style = ttk.Style(window)
+        style.configure("PlayerList.Treeview", rowheight = PLAYER_LIST_IMAGE_SIZE + 4 if self.show_heads else 20)
+        self.tree = ttk.Treeview(window, columns = [column for column, width in PLAYER_LIST_COLUMNS], style = "PlayerList.Treeview")
+        self.tree.heading("#0", text = "Player", anchor = "w")
+        self.tree.column("#0", width = 200, stretch = True)
+        for column, width in PLAYER_LIST_COLUMNS:
+            self.tree.heading(column, text = column, anchor = "w")
+            self.tree.column(column, width = width, stretch = False)
+        self.scrollbar = ttk.Scrollbar(window, orient = "vertical", command = self.tree.yview)
+        self.tree.configure(yscrollcommand = self.scroll)
+        self.scrollbar.pack(side = "right", fill = "y")
+        self.tree.pack(side = "left", fill = "both", expand = 1)
+
+        # The details of every player are computed at once from the aggregates of the filtered data
+        players = [player for player in data.players if data.session_count[player]]
+        names = [data.get_name(player) for player in players]
+        average_session = data.total_played[players] / data.session_count[players]
+        self.names = {}
+        for player, name, average in zip(players, names, average_session):
+            item = self.tree.insert("", "end", text = name if display_mode in [DISPLAY_NAME, DISPLAY_NAME_AND_HEAD] else "", values = (
+                to_datetime(data.first_seen[player]),
+                to_datetime(data.last_seen[player]),
+                format_minutes(data.total_played[player]),
+                data.day_count[player],
+                data.session_count[player],
+                format_minutes(average)
+            ))
+            self.names[item] = name
+
+    def scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if self.show_heads:
+            self.load_images()
+
+    def get_visible_items(self):
+        items = self.tree.get_children()
+        first, last = self.tree.yview()
+        return items[floor(first * len(items)):ceil(last * len(items))]
+
+    def load_images(self):
+        # Images that are still downloading are checked again later, the window may be closed by then
+        if not self.window.winfo_exists():
+            return
+        from PIL import ImageTk
+        waiting = False
+        for item in self.get_visible_items():
+            if item in self.images:
+                continue
+            name = self.names[item]
+            image = player_images.request(name)
+            if isinstance(image, Future) and not image.done():
+                waiting = True
+                continue
+            player_image = player_images.get_thumbnail(name, PLAYER_LIST_IMAGE_SIZE) if image is not None else None
+            self.images[item] = ImageTk.PhotoImage(player_image) if player_image else None
+            if self.images[item]:
+                self.tree.item(item, image = self.images[item])
+        if waiting and self.poll is None:
+            self.poll = self.window.after(PLAYER_LIST_POLL_INTERVAL, self.load_pending_images)
+
+    def load_pending_images(self):
+        self.poll = None
+        self.load_images()
 
 # Create the main GUI class
 class MinecraftStatsApp:
-    def __init__(self, root, data, min_date, max_date):
+    def __init__(self, root, data, min_date, max_date, load_summary = ""):
         self.root = root
         self.data = data
         self.min_date = min_date
         self.max_date = max_date
-        self.canvas = None
+        self.chart_request = 0
+        # The worker thread renders the charts and adds the followed events, so the sessions never change during a render
+        self.executor = ThreadPoolExecutor(max_workers = 1)
+        self.follower = None
+        self.follow_change = None
+        self.follow_refresh = 0
 
         self.root.title("Minecraft server player stats")
 
@@ -156,28 +126,46 @@ class MinecraftStatsApp:
         self.filter_type = tk.StringVar(value = FILTER_TIME_PLAYED)
         self.filter_min = tk.StringVar(value = "")
         self.filter_max = tk.StringVar(value = "")
+        self.server = tk.StringVar(value = ALL_SERVERS)
+        self.follow = tk.BooleanVar(value = False)
 
         self.setup_ui()
+        self.status_bar.configure(text = load_summary)
         self.update_chart()
 
     def setup_ui(self):
+        # GUI and image dependencies are imported when first used, so importing this module stays cheap
+        from tkcalendar import DateEntry
+
         # Date range selection
         frame = tk.Frame(self.root)
         frame.pack(pady = 5)
 
         tk.Label(frame, text = "From").pack(side = tk.LEFT)
-        DateEntry(frame, textvariable = self.start_date, date_pattern = "dd/mm/yyyy", mindate = self.min_date.date(), maxdate = self.max_date.date(), day = self.get_start_date().day, month = self.get_start_date().month, year = self.get_start_date().year).pack(side = tk.LEFT, padx = 5)
+        self.start_date_entry = DateEntry(frame, textvariable = self.start_date, date_pattern = "dd/mm/yyyy", mindate = self.min_date.date(), maxdate = self.max_date.date(), day = self.get_start_date().day, month = self.get_start_date().month, year = self.get_start_date().year)
+        self.start_date_entry.pack(side = tk.LEFT, padx = 5)
 
         tk.Label(frame, text = "To").pack(side = tk.LEFT)
-        DateEntry(frame, textvariable = self.end_date, date_pattern = "dd/mm/yyyy", mindate = self.min_date.date(), maxdate = self.max_date.date(), day = self.get_end_date().day, month = self.get_end_date().month, year = self.get_end_date().year).pack(side = tk.LEFT, padx = 5)
+        self.end_date_entry = DateEntry(frame, textvariable = self.end_date, date_pattern = "dd/mm/yyyy", mindate = self.min_date.date(), maxdate = self.max_date.date(), day = self.get_end_date().day, month = self.get_end_date().month, year = self.get_end_date().year)
+        self.end_date_entry.pack(side = tk.LEFT, padx = 5)
 
         # Button to refresh chart
         tk.Button(frame, text = "Update chart", command = self.update_chart).pack(side = tk.LEFT, padx = 5)
 
+        # Follow the new lines of the data files and of the server log
+        tk.Checkbutton(frame, text = "Follow logs", variable = self.follow, command = self.start_following).pack(side = tk.LEFT)
+
         # Player filter selection
         frame = tk.Frame(self.root)
         frame.pack(pady = 5)
 
+        # Server selection, only shown when the data folder holds several servers
+        if len(self.data.servers) > 1:
+            tk.Label(frame, text = "Server").pack(side = tk.LEFT)
+            server_menu = ttk.Combobox(frame, textvariable = self.server, values = [ALL_SERVERS] + list(self.data.servers), state = "readonly")
+            server_menu.pack(side = tk.LEFT, padx = 5)
+            server_menu.bind("<<ComboboxSelected>>", lambda event: self.update_chart())
+
         tk.Label(frame, text="Filter by").pack(side=tk.LEFT)
         ttk.Combobox(frame, textvariable=self.filter_type, values=[FILTER_TIME_PLAYED, FILTER_DAY_PLAYED]).pack(side=tk.LEFT, padx=5)
 
@@ -208,13 +196,26 @@ class MinecraftStatsApp:
         # Chart type selection
         frame = tk.Frame(self.root)
         frame.pack(pady = 5)
-        chart_options = [GRAPH_GANTT_PLAY_TIME, GRAPH_GANTT_PLAY_DAY, GRAPH_LINE_PLAYER_HOUR, GRAPH_LINE_PLAYER_DAY, GRAPH_STACK_BAR_PLAY_TIME, GRAPH_BAR_PLAY_TIME, GRAPH_PIE_PLAY_TIME, GRAPH_PIE_PLAY_DAY]
-        chart_menu = ttk.Combobox(frame, textvariable = self.chart_type, values = chart_options)
+        chart_menu = ttk.Combobox(frame, textvariable = self.chart_type, values = CHART_TYPES)
         chart_menu.pack(side = tk.LEFT, padx = 10)
         chart_menu.bind("<<ComboboxSelected>>", lambda event: self.update_chart())
 
         # Button to open details
-        tk.Button(frame, text = "Show details", command = lambda: self.show_data_list(self.get_filtered_data())).pack(side = tk.LEFT)
+        tk.Button(frame, text = "Show details", command = self.show_details).pack(side = tk.LEFT)
+
+        # Rendering progress
+        self.progress = ttk.Progressbar(frame, mode = "indeterminate", length = 100)
+        self.progress.pack(side = tk.LEFT, padx = 10)
+        self.status = tk.Label(frame, text = "")
+        self.status.pack(side = tk.LEFT)
+
+        # Time spent in every stage of the last refresh
+        self.status_bar = tk.Label(self.root, text = "", anchor = "w", relief = tk.SUNKEN)
+        self.status_bar.pack(side = tk.BOTTOM, fill = tk.X)
+
+        # Rendered chart
+        self.chart = tk.Label(self.root)
+        self.chart.pack()
 
     def get_start_date(self):
         return format_datetime(self.start_date.get(), time.min, self.min_date)
@@ -234,320 +235,142 @@ class MinecraftStatsApp:
     def get_data_filters(self):
         return self.get_filter_min(), self.get_filter_max()
 
-    def get_filtered_data(self):
-        start_date, end_date = self.get_data_dates()
-        # Filter data by date range
-        filtered_data = {
-            player: {
-                "sessions": [{
-                    "start": max(session["start"], start_date),
-                    "end": min(session["end"], end_date),
-                    "duration": (min(session["end"], end_date) - max(session["start"], start_date)).total_seconds() / 60,
-                } for session in info["sessions"] if start_date <= session["start"] <= end_date or start_date <= session["end"] <= end_date],
-                "totalPlayed": sum([(min(session["end"], end_date) - max(session["start"], start_date)).total_seconds() / 60 for session in info["sessions"] if start_date <= session["start"] <= end_date or start_date <= session["end"] <= end_date]),
-                "dayPlayed": [day for day in info["dayPlayed"] if start_date.date() <= day <= end_date.date()],
-                "color": info["color"]
-            }
-            for player, info in self.data.items()
-        }
-        # Filter data
-        filter_min, filter_max = self.get_data_filters()
-        if filter_min > 0 or filter_max > 0:
-            if self.filter_type.get() == FILTER_TIME_PLAYED:
-                filtered_data = {player: info for player, info in filtered_data.items() if (filter_min <= 0 or info["totalPlayed"] >= (filter_min * 60)) and (filter_max <= 0 or info["totalPlayed"] <= (filter_max * 60))}
-            elif self.filter_type.get() == FILTER_DAY_PLAYED:
-                filtered_data = {player: info for player, info in filtered_data.items() if (filter_min <= 0 or len(info["dayPlayed"]) >= filter_min) and (filter_max <= 0 or len(info["dayPlayed"]) <= filter_max)}
-        # Sort data
-        if self.sort_mode.get() == SORT_NAME:
-            filtered_data = {player: info for player, info in sorted(filtered_data.items(), key = lambda item: item[0].upper(), reverse = self.sort_reverse.get())}
-        elif self.sort_mode.get() == SORT_PLAY_FIRST:
-            filtered_data = {player: info for player, info in sorted([item for item in filtered_data.items() if item[1]["sessions"]], key = lambda item: (item[1]["sessions"][0]["start"]), reverse = self.sort_reverse.get())}
-        elif self.sort_mode.get() == SORT_PLAY_LAST:
-            filtered_data = {player: info for player, info in sorted([item for item in filtered_data.items() if item[1]["sessions"]], key = lambda item: (item[1]["sessions"][-1]["end"]), reverse = self.sort_reverse.get())}
-        elif self.sort_mode.get() == SORT_PLAY_TIME:
-            filtered_data = {player: info for player, info in sorted(filtered_data.items(), key = lambda item: item[1]["totalPlayed"], reverse = self.sort_reverse.get())}
-        elif self.sort_mode.get() == SORT_PLAY_DAY:
-            filtered_data = {player: info for player, info in sorted(filtered_data.items(), key = lambda item: len(item[1]["dayPlayed"]), reverse = self.sort_reverse.get())}
-        return filtered_data
+    def get_chart_options(self):
+        # Snapshot of the selected options, tkinter variables can only be read from the main thread
+        return ChartOptions(*self.get_data_dates(), self.chart_type.get(), self.display_mode.get(), self.sort_mode.get(), self.sort_reverse.get(), self.filter_type.get(), *self.get_data_filters(), self.server.get())
+
+    def get_filtered_data(self, options = None):
+        return get_filtered_data(self.data, options or self.get_chart_options())
 
     def update_chart(self):
-        fig = Figure(figsize=(18, 8))
-        ax = fig.add_subplot(111)
-        filtered_data = self.get_filtered_data()
-
-        # Chart selection logic
-        chart_type = self.chart_type.get()
-        if chart_type == GRAPH_BAR_PLAY_TIME:
-            self.plot_total_time_bar_chart(ax, filtered_data)
-        elif chart_type == GRAPH_LINE_PLAYER_DAY:
-            self.plot_daily_active_players_line_chart(ax, filtered_data)
-        elif chart_type == GRAPH_LINE_PLAYER_HOUR:
-            self.plot_hourly_active_players_line_chart(ax, filtered_data)
-        elif chart_type == GRAPH_GANTT_PLAY_TIME:
-            self.plot_gantt_chart_time(ax, filtered_data)
-        elif chart_type == GRAPH_GANTT_PLAY_DAY:
-            self.plot_gantt_chart_day(ax, filtered_data)
-        elif chart_type == GRAPH_STACK_BAR_PLAY_TIME:
-            self.plot_daily_play_time_stacked_bar_chart(ax, filtered_data)
-        elif chart_type == GRAPH_PIE_PLAY_TIME:
-            self.plot_total_time_pie_chart(ax, filtered_data)
-        elif chart_type == GRAPH_PIE_PLAY_DAY:
-            self.plot_active_days_pie_chart(ax, filtered_data)
-        else:
-            self.show_data_list(filtered_data)
+        options = self.get_chart_options()
+        if options.chart_type not in CHART_TYPES:
+            self.show_details(options)
             return  # No plot needed for list
 
-        # Remove old canvas in tkinter
-        for widget in self.root.winfo_children():
-            if isinstance(widget, tk.Canvas):
-                widget.destroy()
-
-        # Display canvas in tkinter
-        canvas = FigureCanvasTkAgg(fig, self.root)
-        canvas.get_tk_widget().pack()
-        canvas.draw()
-
-    # Chart plotting methods
-    def plot_total_time_bar_chart(self, ax, data):
-        players = [player for player in data.keys() if data[player]["totalPlayed"] > 0]
-        total_played_hours = [info["totalPlayed"] / 60 for info in data.values() if info["totalPlayed"] > 0]  # Convert minutes to hours
-
-        ax.bar([player + (" " * (8 if self.display_mode.get() == DISPLAY_NAME_AND_HEAD else 0)) for player in players], total_played_hours, color=[data[player]["color"] for player in players])
-
-        for player in players:
-            if self.display_mode.get() in [DISPLAY_HEAD, DISPLAY_NAME_AND_HEAD]:
-                player_image = get_player_image(player)
-                if player_image:
-                    ax.add_artist(AnnotationBbox(OffsetImage(player_image, zoom = 0.1), (player + (" " * (8 if self.display_mode.get() == DISPLAY_NAME_AND_HEAD else 0)), 0), frameon = False, box_alignment = (0.5, 1.5)))
-
-        if self.display_mode.get() == DISPLAY_HEAD:
-            for label in ax.get_xticklabels():
-                label.set_color(plt.matplotlib.colors.to_rgba("white", 0))
-
-        ax.set_title("Time played by player")
-        ax.set_xlabel("Players")
-        ax.set_ylabel("Time played (hours)")
-        ax.tick_params(axis = 'x', rotation = 45 if self.display_mode.get() == DISPLAY_NAME else 90)
-
-    def plot_hourly_active_players_line_chart(self, ax, data):
-        hourly_activity = pd.DataFrame(index=pd.date_range(self.min_date.replace(microsecond=0, second=0, minute=0), self.max_date.replace(microsecond=0, second=0, minute=0), freq='h'))
-        hourly_activity['active_players'] = 0
-        hourly_active_players = {hour: set() for hour in hourly_activity.index}
-
-        for player, details in data.items():
-            for session in details["sessions"]:
-                session_start = session["start"]
-                session_end = session["end"]
-                # Clip session times to fall within the min/max date range
-                session_start = max(session_start, self.min_date).replace(microsecond=0, second=0, minute=0)
-                session_end = min(session_end, self.max_date).replace(microsecond=0, second=0, minute=0)
-                # Create an hourly range for this session
-                hourly_range = pd.date_range(session_start, session_end, freq='h')
-                # Add the player to the active players set for these hours
-                for hour in hourly_range:
-                    if hour in hourly_active_players:
-                        hourly_active_players[hour].add(player)
-
-        # Convert the sets into counts of unique players
-        for hour, players in hourly_active_players.items():
-            hourly_activity.loc[hour, 'active_players'] = len(players)
-
-        # Remove empty values at the beginning and end
-        first_valid = hourly_activity[hourly_activity['active_players'] > 0].first_valid_index()
-        last_valid = hourly_activity[hourly_activity['active_players'] > 0].last_valid_index()
-        if first_valid is not None and last_valid is not None:
-            hourly_activity = hourly_activity.loc[first_valid:last_valid]
-
-        ax.plot(hourly_activity.index, hourly_activity['active_players'], color='blue', alpha=0.7)
-        ax.fill_between(hourly_activity.index, hourly_activity['active_players'], color='lightblue', alpha=0.5)
-        ax.set_title("Hourly active players")
-        ax.set_xlabel("Hour")
-        ax.set_ylabel("Number of active players")
-        ax.xaxis.set_major_formatter(mdates.DateFormatter("%d/%m/%y %H:%M"))
-        ax.tick_params(axis = 'x', rotation = 45)
-
-    def plot_daily_active_players_line_chart(self, ax, data):
-        all_dates = pd.date_range(self.min_date, self.max_date)
-        daily_active_counts = {date.date(): 0 for date in all_dates}
-
-        for info in data.values():
-            for day in info["dayPlayed"]:
-                if day in daily_active_counts.keys():
-                    daily_active_counts[day] += 1
-
-        daily_active_counts = trim_dictionary(daily_active_counts, 0)
-        dates = list(daily_active_counts.keys())
-        active_counts = list(daily_active_counts.values())
-
-        ax.plot(dates, active_counts, color="blue", alpha=0.7)
-        ax.fill_between(dates, active_counts, color="lightblue", alpha=0.5)
-        ax.scatter(dates, active_counts, color="blue", s=50, label="Player count")
-        ax.set_title("Daily active players")
-        ax.set_xlabel("Date")
-        ax.set_ylabel("Number of active players")
-        ax.xaxis.set_major_formatter(mdates.DateFormatter("%d/%m/%y"))
-        ax.xaxis.set_major_locator(mdates.AutoDateLocator())
-        ax.tick_params(axis = 'x', rotation = 45)
-
-    def plot_gantt_chart_time(self, ax, data):
-        dates = pd.date_range(min([min(info["dayPlayed"]) for info in data.values() if info["dayPlayed"]]), (max([max(info["dayPlayed"]) for info in data.values() if info["dayPlayed"]]) + timedelta(days = 1)))
-
-        for i, (player, info) in enumerate([(player, info) for (player, info) in data.items() if info["sessions"]]):
-            if self.display_mode.get() in [DISPLAY_HEAD, DISPLAY_NAME_AND_HEAD]:
-                player_image = get_player_image(player)
-                if player_image:
-                    ax.add_artist(AnnotationBbox(OffsetImage(player_image, zoom = 0.1), (min(dates), i), frameon = False, box_alignment = (1.5, 0.5)))
-            for session in info["sessions"]:
-                ax.barh(player + (' ' * (8 if self.display_mode.get() == DISPLAY_NAME_AND_HEAD else 0)), (session["end"] - session["start"]).total_seconds() / (60 * 60 * 24), left = session["start"], color = info["color"])
-
-        for date in dates:
-            ax.axvline(date, color = "gray", linestyle = "-", linewidth = 0.5)
-
-        if self.display_mode.get() == DISPLAY_HEAD:
-            for label in ax.get_yticklabels():
-                label.set_color(plt.matplotlib.colors.to_rgba("white", 0))
-
-        ax.set_title("Play sessions")
-        ax.set_xlabel("Date")
-        ax.set_ylabel("Players")
-        ax.set_xlim(min(dates), max(dates))
-        ax.xaxis.set_major_formatter(mdates.DateFormatter("%d/%m/%y"))
-        ax.xaxis.set_major_locator(mdates.AutoDateLocator())
-        ax.tick_params(axis='x', rotation=45)
-
-    def plot_gantt_chart_day(self, ax, data):
-        dates = pd.date_range(min([min(info["dayPlayed"]) for info in data.values() if info["dayPlayed"]]), (max([max(info["dayPlayed"]) for info in data.values() if info["dayPlayed"]]) + timedelta(days = 1)))
-
-        for i, (player, info) in enumerate([(player, info) for (player, info) in data.items() if info["dayPlayed"]]):
-            if self.display_mode.get() in [DISPLAY_HEAD, DISPLAY_NAME_AND_HEAD]:
-                player_image = get_player_image(player)
-                if player_image:
-                    ax.add_artist(AnnotationBbox(OffsetImage(player_image, zoom = 0.1), (min(dates), i), frameon = False, box_alignment = (1.5, 0.5)))
-            for day in info["dayPlayed"]:
-                ax.barh(player + (' ' * (8 if self.display_mode.get() == DISPLAY_NAME_AND_HEAD else 0)), 1, left = day, color = info["color"])
-
-        for date in dates:
-            ax.axvline(date, color = "gray", linestyle = "-", linewidth = 0.5)
-
-        if self.display_mode.get() == DISPLAY_HEAD:
-            for label in ax.get_yticklabels():
-                label.set_color(plt.matplotlib.colors.to_rgba("white", 0))
-
-        ax.set_title("Active days")
-        ax.set_xlabel("Date")
-        ax.set_ylabel("Players")
-        ax.set_xlim(min(dates), max(dates))
-        ax.xaxis.set_major_formatter(mdates.DateFormatter("%d/%m/%y"))
-        ax.xaxis.set_major_locator(mdates.AutoDateLocator())
-        ax.tick_params(axis='x', rotation=45)
-
-    def plot_daily_play_time_stacked_bar_chart(self, ax, data):
-        all_dates = pd.date_range(min([min(info["dayPlayed"]) for info in data.values() if info["dayPlayed"]]), max([max(info["dayPlayed"]) for info in data.values() if info["dayPlayed"]]))
-        daily_play_times = {player: [0] * len(all_dates) for player in data.keys() if data[player]["sessions"]}
-
-        for i, date in enumerate(all_dates):
-            for player, info in data.items():
-                if player in daily_play_times:
-                    daily_play_times[player][i] += sum((session["end"] - session["start"]).total_seconds() / 3600 for session in info["sessions"] if session["start"].date() == date.date())
-
-        dates = list(all_dates)
-        bottom = np.zeros(len(dates))
-        for player, play_times in daily_play_times.items():
-            # A space is added because labels starting with an underscore are not shown
-            ax.bar(dates, play_times, bottom = bottom, label = rf" {player}", color = data[player]["color"])
-            bottom += np.array(play_times)
-
-        ax.set_title("Daily play time")
-        ax.set_xlabel("Date")
-        ax.set_ylabel("Total play time (hours)")
-        ax.legend()
-        ax.xaxis.set_major_formatter(mdates.DateFormatter("%d/%m/%y"))
-        ax.xaxis.set_major_locator(mdates.AutoDateLocator())
-        ax.tick_params(axis='x', rotation=45)
-
-    def plot_total_time_pie_chart(self, ax, data):
-        players = [player for player in data.keys() if data[player]["totalPlayed"] > 0]
-        total_played_hours = [info["totalPlayed"] / 60 for info in data.values() if info["totalPlayed"] > 0]  # Convert minutes to hours
-
-        ax.set_title("Play time distribution")
-        wedges, texts, junk = ax.pie(total_played_hours, labels = players if self.display_mode.get() == DISPLAY_NAME else [("" if self.display_mode.get() == DISPLAY_HEAD else ((" " * 4) + player + (" " * 4))) for player in players], autopct = (lambda val: str(round(val / 100 * sum(total_played_hours))) + "H"), startangle = 90, colors = [data[player]["color"] for player in players])
-        # Add images next to each label
-        if self.display_mode.get() in [DISPLAY_HEAD, DISPLAY_NAME_AND_HEAD]:
-            for i, player in enumerate(players):
-                player_image = get_player_image(player)
-                if player_image:
-                    # Calculate position for annotation based on wedge angle
-                    angle = (wedges[i].theta2 - wedges[i].theta1) / 2. + wedges[i].theta1
-                    x = np.cos(np.radians(angle)) * 1.1
-                    y = np.sin(np.radians(angle)) * 1.1
-                    # Add image next to label
-                    ab = AnnotationBbox(OffsetImage(player_image, zoom = 0.1), (x, y), frameon = False, box_alignment = (0.5, 0.5))
-                    ax.add_artist(ab)
-
-    def plot_active_days_pie_chart(self, ax, data):
-        players = [player for player in data.keys() if data[player]["dayPlayed"]]
-        active_days_count = [len(info["dayPlayed"]) for info in data.values() if info["dayPlayed"]]
-
-        ax.set_title("Active days distribution")
-        wedges, texts, junk = ax.pie(active_days_count, labels = players if self.display_mode.get() == DISPLAY_NAME else [("" if self.display_mode.get() == DISPLAY_HEAD else ((" " * 4) + player + (" " * 4))) for player in players], autopct = (lambda val: round(val / 100 * sum(active_days_count))), startangle = 90, colors = [data[player]["color"] for player in players])
-        # Add images next to each label
-        if self.display_mode.get() in [DISPLAY_HEAD, DISPLAY_NAME_AND_HEAD]:
-            for i, player in enumerate(players):
-                player_image = get_player_image(player)
-                if player_image:
-                    # Calculate position for annotation based on wedge angle
-                    angle = (wedges[i].theta2 - wedges[i].theta1) / 2. + wedges[i].theta1
-                    x = np.cos(np.radians(angle)) * 1.1
-                    y = np.sin(np.radians(angle)) * 1.1
-                    # Add image next to label
-                    ab = AnnotationBbox(OffsetImage(player_image, zoom = 0.1), (x, y), frameon = False, box_alignment = (0.5, 0.5))
-                    ax.add_artist(ab)
-
-    def show_data_list(self, data):
+        # Render the chart in the background, a newer request supersedes the ones still waiting or running
+        self.chart_request += 1
+        future = self.executor.submit(self.render_chart, self.chart_request, options)
+        self.status.configure(text = "Rendering chart...")
+        self.progress.start()
+        self.root.after(CHART_POLL_INTERVAL, self.show_chart, self.chart_request, future)
+
+    def render_chart(self, request, options):
+        # Runs in the worker thread, the chart is drawn off-screen and returned as an image with the refresh measuring it
+        if request != self.chart_request:
+            return None
+        refresh = profiler.start(options.chart_type)
+        try:
+            filtered_data = self.get_filtered_data(options)
+            prefetch_player_images(filtered_data, options)
+            if request != self.chart_request:
+                return None
+            fig = create_figure()
+            plot_chart(fig.add_subplot(111), filtered_data, options)
+            if request != self.chart_request:
+                return None
+            with profiler.span("draw"):
+                fig.canvas.draw()
+                from PIL import Image
+                return Image.frombuffer("RGBA", fig.canvas.get_width_height(), fig.canvas.buffer_rgba()).copy(), refresh
+        finally:
+            refresh.stop_capture()
+
+    def show_chart(self, request, future):
+        # Wait for the worker thread from the tkinter event loop
+        if not future.done():
+            self.root.after(CHART_POLL_INTERVAL, self.show_chart, request, future)
+            return
+        if request != self.chart_request:
+            return
+        self.progress.stop()
+        from PIL import ImageTk
+        try:
+            image, refresh = future.result()
+            with refresh.span("show"):
+                image = ImageTk.PhotoImage(image)
+                self.chart.configure(image = image)
+                self.chart.image = image
+        except Exception as e:
+            print(f"Chart could not be rendered.\nError: {e}")
+            self.status.configure(text = "Chart could not be rendered")
+            return
+        self.status.configure(text = "")
+        self.status_bar.configure(text = profiler.finish(refresh))
+
+    def start_following(self):
+        if self.follow.get() and self.follower is None:
+            self.follower = LogFollower(self.data)
+            self.follow_logs()
+
+    def follow_logs(self):
+        if not self.follow.get():
+            # Following stops until it is enabled again, the new lines are then read from where it stopped
+            self.root.after(FOLLOW_POLL_INTERVAL, self.follow_logs)
+            return
+        # New events are read in the worker thread, between two renders
+        future = self.executor.submit(self.follower.update, to_seconds(datetime.now()))
+        self.root.after(CHART_POLL_INTERVAL, self.show_follow_update, future)
+
+    def show_follow_update(self, future):
+        if not future.done():
+            self.root.after(CHART_POLL_INTERVAL, self.show_follow_update, future)
+            return
+        try:
+            changed_from = future.result()
+        except Exception as e:
+            print(f"Logs could not be followed.\nError: {e}")
+            changed_from = None
+        if changed_from is not None:
+            self.follow_change = changed_from if self.follow_change is None else min(self.follow_change, changed_from)
+            # Newer dates can be selected, and a range ending on the last date keeps ending on it
+            max_date = to_datetime(self.data.now)
+            if self.end_date.get() == self.max_date.strftime(DATE_FORMAT):
+                self.end_date.set(max_date.strftime(DATE_FORMAT))
+            self.max_date = max_date
+            self.start_date_entry.config(maxdate = max_date.date())
+            self.end_date_entry.config(maxdate = max_date.date())
+        # The chart is refreshed at most once per interval, and only when the changes are in its date range
+        if self.follow_change is not None and monotonic() - self.follow_refresh >= FOLLOW_REFRESH_INTERVAL:
+            if self.follow_change <= to_seconds(self.get_end_date()) and self.chart_type.get() in CHART_TYPES:
+                self.update_chart()
+            self.follow_change = None
+            self.follow_refresh = monotonic()
+        self.root.after(FOLLOW_POLL_INTERVAL, self.follow_logs)
+
+    def show_details(self, options = None):
+        # The data is filtered in the worker thread, where the followed events are added to the sessions
+        options = options or self.get_chart_options()
+        future = self.executor.submit(self.get_filtered_data, options)
+        self.root.after(CHART_POLL_INTERVAL, self.show_data_list, options, future)
+
+    def show_data_list(self, options, future):
+        if not future.done():
+            self.root.after(CHART_POLL_INTERVAL, self.show_data_list, options, future)
+            return
+        try:
+            data = future.result()
+        except Exception as e:
+            print(f"Player data could not be filtered.\nError: {e}")
+            return
         window = tk.Toplevel(self.root)
-        window.title("Player data " + (' - '.join([date.strftime(DATE_FORMAT) for date in self.get_data_dates()])))
-        window.geometry("250x500")
-
-        # Add a scrollbar
-        canvas = tk.Canvas(window)
-        canvas.pack(side = "left", fill = "both", expand = 1)
-        scrollbar = tk.Scrollbar(canvas, orient = "vertical", command = canvas.yview)
-        scrollbar.pack(side = "right", fill = "y")
-        canvas.configure(yscrollcommand=scrollbar.set)
-        canvas.bind('<Configure>', lambda e: canvas.configure(scrollregion = canvas.bbox("all")))
-        frame = tk.Frame(canvas, width = 500, height = 100)
-        canvas.create_window((0, 0), window = frame, anchor = "nw")
-
-        for player, info in [(player, info) for (player, info) in data.items() if info["sessions"]]:
-            label_frame = tk.Frame(frame)
-            label_frame.pack(anchor = "w")
-
-            if self.display_mode.get() in [DISPLAY_HEAD, DISPLAY_NAME_AND_HEAD]:
-                player_image = get_player_image(player)
-                if player_image:
-                    player_image = player_image.resize((25, 25))
-                    img = ImageTk.PhotoImage(player_image)
-                    image = tk.Label(label_frame, image = img)
-                    image.image = img
-                    image.pack(side = tk.LEFT, padx = (0, 5))
-            if self.display_mode.get() in [DISPLAY_NAME, DISPLAY_NAME_AND_HEAD]:
-                tk.Label(label_frame, text = f"{player}", font = ("Arial", 12, "bold")).pack(side = tk.LEFT)
-
-            average_session = sum([session["duration"] for session in info["sessions"]]) / len(info["sessions"])
-            details = (
-                f"First Seen: {info["sessions"][0]['start']}\n"
-                f"Last Seen: {info["sessions"][-1]['end']}\n"
-                f"Total Played: {floor(info['totalPlayed'] / 60):.0f}H{info['totalPlayed'] % 60:02.0f}\n"
-                f"Days Played: {len(info['dayPlayed'])}\n"
-                f"Sessions: {len(info["sessions"])}\n"
-                f"Average session: {floor(average_session / 60):.0f}H{average_session % 60:02.0f}"
-            )
-            details_label = tk.Label(frame, text=details, justify="left", font=("Arial", 9))
-            details_label.pack(anchor="w", padx=20)
+        window.title("Player data " + (' - '.join([date.strftime(DATE_FORMAT) for date in (options.start_date, options.end_date)])))
+        window.geometry("900x500")
+        PlayerList(window, data, options.display_mode)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description = "Visualize the activity of the players of a Minecraft server.")
+    parser.add_argument("--profile", choices = profiler.PROFILE_MODES, default = profiler.mode, help = f"capture every refresh with cProfile or tracemalloc, also set by the {profiler.PROFILE_ENV} environment variable")
+    return parser.parse_args()
 
 # Run the app
 if __name__ == "__main__":
-    data, min_date, max_date = parse_data()
+    profiler.set_mode(parse_args().profile)
+    refresh = profiler.start("Load data")
+    with profiler.span("parse"):
+        data, min_date, max_date = parse_data()
+    profiler.count("sessions", len(data))
+    load_summary = profiler.finish(refresh)
     root = tk.Tk()
-    app = MinecraftStatsApp(root, data, min_date, max_date)
+    app = MinecraftStatsApp(root, data, min_date, max_date, load_summary)
     root.mainloop()
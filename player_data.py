@@ -0,0 +1,894 @@
+import copy
+import hashlib
+import itertools
+import json
+import os
+from array import array
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from functools import lru_cache
+from math import floor
+from threading import Lock
+
+import numpy as np
+
+import profiler
+from line_classifier import ACTION_JOINED, PLAYERS_FILE_MARKERS, PLAYER_PATTERN, classify_lines
+
+# Constants
+DATA_FOLDER = "./data"
+CACHE_FOLDER = "./cache"
+DATA_CACHE_FOLDER = os.path.join(CACHE_FOLDER, "data")
+DATA_CACHE_VERSION = 1
+# Every subfolder of DATA_FOLDER holds the data files of a server named after it, the files directly in DATA_FOLDER are the default server
+# When this file exists it names the servers instead, as {"name": {"folder": "...", "log": "..."}}, the followed server log is optional
+SERVERS_FILE = "./servers.json"
+DEFAULT_SERVER = "default"
+ALL_SERVERS = "All servers"
+# Number of processes parsing servers in parallel, None uses every core
+PARSE_PROCESSES = None
+# Color given to every player, kept so that a player has the same color in every run and export
+PLAYER_COLORS_FILE = os.path.join(CACHE_FOLDER, "player_colors.json")
+# Binary event files written by the log extractor, fixed-width records with the names of their players in a separate file, one per line
+EVENTS_FILE_EXTENSION = ".events"
+EVENTS_NAMES_EXTENSION = ".names"
+EVENT_RECORD = np.dtype([("time", "<i8"), ("player", "<i4"), ("join", "?"), ("padding", "V3")])
+# Number of date range and filter results kept in memory
+FILTER_CACHE_SIZE = 16
+TIME_FORMAT = "%d/%m/%Y %H:%M:%S"
+DATE_FORMAT = "%d/%m/%Y"
+SORT_NAME = "NAME"
+SORT_PLAY_FIRST = "FIRST"
+SORT_PLAY_LAST = "LAST"
+SORT_PLAY_TIME = "TIME"
+SORT_PLAY_DAY = "DAY"
+FILTER_TIME_PLAYED = "Time played (in hours)"
+FILTER_DAY_PLAYED = "Day played"
+EPOCH = datetime(1970, 1, 1)
+SECONDS_PER_HOUR = 60 * 60
+SECONDS_PER_DAY = 24 * SECONDS_PER_HOUR
+# Log file written by the running server, followed with the data files in follow mode
+LATEST_LOG_FILE = "./logs/latest.log"
+# Seconds after which open sessions are extended until now even if no event was read
+FOLLOW_IDLE_INTERVAL = 60
+TIMESTAMP_DATE_FORMATS = ["%m/%d/%y", "%m/%d/%Y", "%d/%m/%Y", "%d/%m/%y", "%Y-%m-%d", "%Y/%m/%d"]
+
+# Folder of a server, its followed server log, and the folder its parsed data files are cached in
+Server = namedtuple("Server", ["name", "folder", "log_file", "cache_folder"])
+
+def get_data_files(folder):
+    return [filename for filename in sorted(os.listdir(folder)) if os.path.isfile(os.path.join(folder, filename)) and not filename.endswith(('.zip', '.tar', '.tar.gz', '.gz', '.rar', EVENTS_NAMES_EXTENSION))]
+
+def get_servers(data_folder = None):
+    data_folder = data_folder or DATA_FOLDER
+    if os.path.exists(SERVERS_FILE):
+        with open(SERVERS_FILE, "r", encoding = "utf-8") as servers_file:
+            return [Server(name, server["folder"], server.get("log"), os.path.join(DATA_CACHE_FOLDER, name)) for name, server in json.load(servers_file).items()]
+    servers = [Server(name, os.path.join(data_folder, name), None, os.path.join(DATA_CACHE_FOLDER, name)) for name in sorted(os.listdir(data_folder)) if os.path.isdir(os.path.join(data_folder, name))]
+    return [Server(DEFAULT_SERVER, data_folder, LATEST_LOG_FILE, DATA_CACHE_FOLDER)] + servers
+
+# Parse and organize player data from files, every server is parsed in its own process and the servers are then merged
+def parse_data():
+    now = to_seconds(datetime.now())
+    servers = get_servers()
+    # The default server is only kept when it has data files or is the only server
+    servers = [server for server in servers if server.name != DEFAULT_SERVER or len(servers) == 1 or get_data_files(server.folder)]
+    if PARSE_PROCESSES == 1 or len(servers) <= 1:
+        parsed = [parse_server(server, now, len(servers) > 1) for server in servers]
+    else:
+        with ProcessPoolExecutor(PARSE_PROCESSES) as executor:
+            parsed = list(executor.map(parse_server, servers, [now] * len(servers), [True] * len(servers)))
+
+    # Global min and max dates
+    times = [time for sessions, min_time, max_time in parsed for time in (min_time, max_time) if time is not None]
+    min_date = to_datetime(min(times)) if times else None
+    max_date = to_datetime(max(times)) if times else None
+
+    sessions = merge_servers({server.name: server_sessions for server, (server_sessions, min_time, max_time) in zip(servers, parsed)}, now)
+    return sessions, min_date, max_date
+
+# Parse the data files of a server into its own sessions, returns the sessions and the time of the first and last events
+# The aggregates merged into the sessions of every server are computed here too, so they are computed in parallel
+def parse_server(server, now, aggregate = False):
+    events, filenames = [], []
+    for filename in get_data_files(server.folder):
+        filepath = os.path.join(server.folder, filename)
+        # Binary event files are read as they are, the other files are parsed and cached
+        events.append(read_events_file(filepath) if filepath.endswith(EVENTS_FILE_EXTENSION) else load_file_events(filepath, server.cache_folder))
+        filenames.append(filename)
+    remove_stale_cache(filenames, server.cache_folder)
+    file_events_list = events
+    events = PlayerEvents.concatenate(file_events_list)
+
+    # Colors are read from the color cache when a chart first needs them
+    sessions = events.get_sessions([], now)
+    # Only the text files are followed, the binary event files are only written by the log extractor
+    sessions.sources = {os.path.join(server.folder, filename): file_events.size for filename, file_events in zip(filenames, file_events_list) if not filename.endswith(EVENTS_FILE_EXTENSION)}
+    sessions.log_file = server.log_file
+    sessions.servers = {server.name: sessions}
+    if aggregate:
+        sessions.get_days_played()
+        sessions.get_play_time_rollup()
+    return sessions, (int(events.time.min()) if len(events) else None), (int(events.time.max()) if len(events) else None)
+
+# Sessions of every server together with a common player table, the sessions of every server stay available in servers
+# The days played and daily play time of every server are merged instead of being computed again from the sessions
+def merge_servers(servers, now):
+    if len(servers) == 1:
+        return next(iter(servers.values()))
+    players = PlayerEvents()
+    player_ids = [np.array([players.get_player_id(name) for name in server.players], dtype = np.int32) for server in servers.values()]
+    start = np.concatenate([server.start for server in servers.values()])
+    order = np.argsort(start, kind = "stable")
+    player = np.concatenate([ids[server.player] for ids, server in zip(player_ids, servers.values())])
+    end = np.concatenate([server.end for server in servers.values()])
+    sessions = SessionStore(players.players, [], player[order], start[order], end[order], now)
+    # Open sessions are kept by server, a player can be connected to several servers at once
+    position = np.empty_like(order)
+    position[order] = np.arange(len(order))
+    offsets = np.cumsum([0] + [len(server) for server in servers.values()])
+    sessions.open_sessions = {(name, int(ids[server.player[i]])): int(position[offset + i]) for (name, server), ids, offset in zip(servers.items(), player_ids, offsets) for i in np.flatnonzero(server.end == now)}
+    days_played = [(ids[day_player], day) for ids, (day_player, day) in zip(player_ids, [server.get_days_played() for server in servers.values()])]
+    keys = np.unique(np.concatenate([(day << 32) | day_player.astype(np.int64) for day_player, day in days_played]))
+    sessions.days_played = ((keys & 0xFFFFFFFF).astype(np.int32), keys >> 32)
+    play_time = [(ids[day_player], day, play_time) for ids, (day_player, day, play_time) in zip(player_ids, [server.get_play_time_rollup() for server in servers.values()])]
+    sessions.daily_play_time = sum_daily_play_time(*(np.concatenate(column) for column in zip(*play_time)))
+    sessions.servers = servers
+    return sessions
+
+def parse_file(filepath):
+    events = PlayerEvents()
+    with open(filepath, "rb") as file:
+        for player, time, join in read_player_events(file, TimestampParser()):
+            events.append(player, time, join)
+    return events
+
+# Read the (player, seconds since EPOCH, joined) events of data file lines
+def read_player_events(lines, timestamp_parser):
+    # Lines are kept as bytes and skipped with a substring check before running the regex
+    for action, line in classify_lines(lines, PLAYERS_FILE_MARKERS):
+        match = PLAYER_PATTERN.match(line)
+        if not match:
+            continue
+        timestamp, player, action = match.groups()
+        yield player.decode("ascii"), timestamp_parser.parse(timestamp.decode("utf-8", "replace")), action == b"joined"
+
+# Read the (player, seconds since EPOCH, joined) events of server log lines, a crash makes every connected player leave
+def read_log_events(lines, connected_players):
+    from log_extractor import match_actions, resolve_action
+    for date, action, player in match_actions(classify_lines(lines)):
+        for entry_player, entry_action in resolve_action(action, player, connected_players):
+            yield entry_player, date // 1000, entry_action == ACTION_JOINED
+
+def read_event_names(filepath):
+    if not os.path.exists(filepath + EVENTS_NAMES_EXTENSION):
+        return []
+    with open(filepath + EVENTS_NAMES_EXTENSION, "r", encoding = "utf-8") as names_file:
+        return names_file.read().splitlines()
+
+# Map a binary event file in memory, its columns are views of the file and nothing is parsed
+def read_events_file(filepath):
+    size = os.path.getsize(filepath)
+    # A record cut by an interrupted write is ignored
+    count = size // EVENT_RECORD.itemsize
+    records = np.memmap(filepath, dtype = EVENT_RECORD, mode = "r", shape = (count,)) if count else np.empty(0, dtype = EVENT_RECORD)
+    events = PlayerEvents(read_event_names(filepath), records["player"], records["time"], records["join"])
+    events.size = size
+    return events
+
+# Append events to a binary event file, the names of new players are written before the records using them
+class EventsFileWriter:
+    def __init__(self, filepath, buffer_size = 65536):
+        self.filepath = filepath
+        self.buffer_size = buffer_size
+        self.players = PlayerEvents(read_event_names(filepath))
+        self.known_players = len(self.players.players)
+        self.records = []
+        # Drop a record cut by an interrupted write so the new records stay aligned
+        if os.path.exists(filepath) and os.path.getsize(filepath) % EVENT_RECORD.itemsize:
+            os.truncate(filepath, os.path.getsize(filepath) // EVENT_RECORD.itemsize * EVENT_RECORD.itemsize)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+
+    def append(self, player, time, join):
+        self.records.append((time, self.players.get_player_id(player), join, b""))
+        if len(self.records) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if len(self.players.players) > self.known_players:
+            with open(self.filepath + EVENTS_NAMES_EXTENSION, "a", encoding = "utf-8") as names_file:
+                names_file.writelines(f"{player}\n" for player in self.players.players[self.known_players:])
+            self.known_players = len(self.players.players)
+        with open(self.filepath, "ab") as events_file:
+            np.array(self.records, dtype = EVENT_RECORD).tofile(events_file)
+        self.records = []
+
+def get_file_fingerprint(filepath):
+    with open(filepath, "rb") as file:
+        return hashlib.file_digest(file, "blake2b").hexdigest()
+
+# Load the events of a data file from the cache, the file is only parsed again if it was modified
+def load_file_events(filepath, cache_folder = None):
+    stat = os.stat(filepath)
+    cache_path = os.path.join(cache_folder or DATA_CACHE_FOLDER, os.path.basename(filepath) + ".npz")
+    cache = PlayerEvents.load(cache_path) if os.path.exists(cache_path) else None
+    # An unchanged size and modification time are trusted without reading the file
+    if cache and cache.size == stat.st_size and cache.mtime == stat.st_mtime_ns:
+        return cache
+    fingerprint = get_file_fingerprint(filepath)
+    if not cache or cache.size != stat.st_size or cache.fingerprint != fingerprint:
+        cache = parse_file(filepath)
+        print(f"Generated cache data for file '{filepath}'.")
+    cache.size, cache.mtime, cache.fingerprint = stat.st_size, stat.st_mtime_ns, fingerprint
+    cache.save(cache_path)
+    return cache
+
+def remove_stale_cache(filenames, cache_folder = None):
+    # Remove the cached events of the data files that no longer exist, the subfolders are the caches of the other servers
+    cache_folder = cache_folder or DATA_CACHE_FOLDER
+    if os.path.isdir(cache_folder):
+        for cache_name in set(os.listdir(cache_folder)) - {filename + ".npz" for filename in filenames}:
+            if os.path.isfile(os.path.join(cache_folder, cache_name)):
+                os.remove(os.path.join(cache_folder, cache_name))
+
+# Convert the timestamps of a file to seconds since EPOCH, using the date layout detected on its first timestamp
+class TimestampParser:
+    def __init__(self):
+        self.date_format = None
+        self.dates = {}
+
+    def detect_date_format(self, timestamp):
+        # Only keep a layout that reads the timestamp the same way dateutil does
+        from dateutil import parser as date_parser
+        date = date_parser.parse(timestamp)
+        for date_format in TIMESTAMP_DATE_FORMATS:
+            try:
+                if datetime.strptime(timestamp, f"{date_format} %H:%M:%S") == date:
+                    return date_format
+            except ValueError:
+                continue
+        return ""
+
+    def parse(self, timestamp):
+        if self.date_format is None:
+            self.date_format = self.detect_date_format(timestamp)
+        date, separator, time_of_day = timestamp.partition(" ")
+        # Fast path for "<date> HH:MM:SS" timestamps, the start of every date is only parsed once
+        if self.date_format and len(time_of_day) == 8 and time_of_day[2] == ":" and time_of_day[5] == ":":
+            if date not in self.dates:
+                try:
+                    self.dates[date] = to_seconds(datetime.strptime(date, self.date_format))
+                except ValueError:
+                    self.dates[date] = None
+            if self.dates[date] is not None and time_of_day[:2].isdigit() and time_of_day[3:5].isdigit() and time_of_day[6:].isdigit():
+                return self.dates[date] + int(time_of_day[:2]) * SECONDS_PER_HOUR + int(time_of_day[3:5]) * 60 + int(time_of_day[6:])
+        # Fall back to dateutil for the timestamps that don't match the detected layout
+        from dateutil import parser as date_parser
+        return to_seconds(date_parser.parse(timestamp))
+
+# distinctipy takes seconds for a few hundred players, so it is only imported and run when colors are needed
+def get_distinct_colors(count, exclude_colors):
+    import distinctipy
+    return distinctipy.get_colors(count, exclude_colors = exclude_colors + [(0, 0, 0), (1, 1, 1)], pastel_factor = 0.25)
+
+# Colors of the players saved in the cache folder, only the players seen for the first time get a new color
+class PlayerColors:
+    def __init__(self, path = PLAYER_COLORS_FILE):
+        self.path = path
+        self.colors = None
+        self.lock = Lock()
+
+    def load(self):
+        try:
+            with open(self.path) as colors_file:
+                return {player: tuple(color) for player, color in json.load(colors_file).items()}
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok = True)
+        with open(self.path + ".tmp", "w") as colors_file:
+            json.dump(self.colors, colors_file, indent = 2)
+        os.replace(self.path + ".tmp", self.path)
+
+    def get_colors(self, players):
+        if self.colors is None:
+            self.colors = self.load()
+        new_players = [player for player in players if player not in self.colors]
+        if new_players:
+            # Another process may have given colors to these players since the file was read
+            self.colors.update(self.load())
+            new_players = list(dict.fromkeys(player for player in new_players if player not in self.colors))
+        if new_players:
+            self.colors.update(zip(new_players, get_distinct_colors(len(new_players), list(self.colors.values()))))
+            self.save()
+        return [self.colors[player] for player in players]
+
+    # Complete a color list shared by session stores with the colors of the players added since it was last completed
+    def complete(self, players, colors):
+        with self.lock:
+            if len(colors) < len(players):
+                colors.extend(self.get_colors(players[len(colors):]))
+        return colors
+
+player_colors = PlayerColors()
+
+def to_seconds(date):
+    return floor((date - EPOCH).total_seconds())
+
+def to_datetime(seconds):
+    return EPOCH + timedelta(seconds = int(seconds))
+
+def to_datetime64(seconds):
+    return np.asarray(seconds, dtype = np.int64).astype("datetime64[s]")
+
+# Join and left events of a data file in file order, times are in seconds since EPOCH using the log local time
+class PlayerEvents:
+    def __init__(self, players = None, player = None, time = None, join = None):
+        self.size, self.mtime, self.fingerprint = None, None, None
+        self.players = list(players) if players is not None else []
+        self.player_ids = {player: i for i, player in enumerate(self.players)}
+        self.player = array("i") if player is None else player
+        self.time = array("q") if time is None else time
+        self.join = array("b") if join is None else join
+
+    def __len__(self):
+        return len(self.time)
+
+    def get_player_id(self, player):
+        # Initialize player if not exists
+        if player not in self.player_ids:
+            self.player_ids[player] = len(self.players)
+            self.players.append(player)
+        return self.player_ids[player]
+
+    def append(self, player, time, join):
+        self.player.append(self.get_player_id(player))
+        self.time.append(time)
+        self.join.append(join)
+
+    def get_arrays(self):
+        return np.asarray(self.player, dtype = np.int32), np.asarray(self.time, dtype = np.int64), np.asarray(self.join, dtype = bool)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        player, time, join = self.get_arrays()
+        # Write to a temporary file first so an interrupted save never leaves a broken cache
+        with open(path + ".tmp", "wb") as file:
+            np.savez(file, version = DATA_CACHE_VERSION, players = np.array(self.players, dtype = str), player = player, time = time, join = join, size = self.size, mtime = self.mtime, fingerprint = self.fingerprint)
+        os.replace(path + ".tmp", path)
+
+    @staticmethod
+    def load(path):
+        try:
+            with np.load(path) as cache:
+                if cache["version"] != DATA_CACHE_VERSION:
+                    return None
+                events = PlayerEvents(cache["players"].tolist(), cache["player"], cache["time"], cache["join"])
+                events.size, events.mtime, events.fingerprint = int(cache["size"]), int(cache["mtime"]), str(cache["fingerprint"])
+                return events
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Cache data '{path}' could not be read.\nError: {e}")
+            return None
+
+    @staticmethod
+    def concatenate(events_list):
+        # Merge the events of several files using a common player table, keeping the file order
+        # A single file is used as it is, so the columns of a mapped event file are not copied
+        if len(events_list) == 1:
+            return PlayerEvents(events_list[0].players, *events_list[0].get_arrays())
+        events = PlayerEvents()
+        player, time, join = [np.empty(0, dtype = np.int32)], [np.empty(0, dtype = np.int64)], [np.empty(0, dtype = bool)]
+        for file_events in events_list:
+            file_player, file_time, file_join = file_events.get_arrays()
+            player_ids = np.array([events.get_player_id(name) for name in file_events.players], dtype = np.int32)
+            player.append(player_ids[file_player] if len(player_ids) else file_player)
+            time.append(file_time)
+            join.append(file_join)
+        events.player, events.time, events.join = np.concatenate(player), np.concatenate(time), np.concatenate(join)
+        return events
+
+    def get_sessions(self, colors, now):
+        # A join ends the previous session of the player and starts a new one, a left only ends it
+        # Every session therefore lasts until the next event of the same player, or until now if there is none
+        player, time, join = self.get_arrays()
+        order = np.argsort(player, kind = "stable")
+        player, time, join = player[order], time[order], join[order]
+        end = np.append(time[1:], now)
+        end[:-1][player[1:] != player[:-1]] = now
+        order = np.argsort(time[join], kind = "stable")
+        return SessionStore(self.players, colors, player[join][order], time[join][order], end[join][order], now)
+
+# Compact columnar storage of every play session sorted by start, times are in seconds since EPOCH using the log local time
+class SessionStore:
+    def __init__(self, players, colors, player, start, end, now = None):
+        self.players = players
+        self.colors = colors
+        self.player = np.asarray(player, dtype = np.int32)
+        self.start = np.asarray(start, dtype = np.int64)
+        self.end = np.asarray(end, dtype = np.int64)
+        self.days_played = None
+        self.long_sessions = None
+        # Rollups of the whole store built on first use and updated with it: (first hour, unique active players of every hour),
+        # (first day, players active on every day) and minutes played by every player on every day, sorted by day then player
+        self.hourly_active = None
+        self.daily_active = None
+        self.daily_play_time = None
+        # Sessions still open end at now, they are extended and closed by the events added while following the logs
+        self.now = now
+        self.open_sessions = None
+        self.player_ids = None
+        self.buffers = None
+        # Size of the data files read into the store, and earliest time changed by every update of the store
+        self.sources = {}
+        self.changes = []
+        # Followed server log, and sessions of every server the store was merged from, a single server store only contains itself
+        self.log_file = None
+        self.servers = {}
+
+    def __len__(self):
+        return len(self.start)
+
+    def get_colors(self):
+        # The color list is shared with the subsets of the store and only completed for the players added since the last call
+        if len(self.colors) < len(self.players):
+            player_colors.complete(self.players, self.colors)
+        return self.colors
+
+    def get_color(self, player):
+        return self.get_colors()[player]
+
+    def get_server(self, server):
+        return self if server == ALL_SERVERS else self.servers[server]
+
+    def get_duration(self):
+        # Duration of every session in minutes
+        return (self.end - self.start) / 60
+
+    def get_subset(self, index):
+        return SessionStore(self.players, self.colors, self.player[index], self.start[index], self.end[index])
+
+    def get_clipped(self, start, end):
+        return SessionStore(self.players, self.colors, self.player, np.maximum(self.start, start), np.minimum(self.end, end))
+
+    def get_overlapping(self, start, end):
+        # Indexes of the sessions overlapping the range, in start order
+        # Sessions are sorted by start so only the sessions starting less than a day before the range need to be checked,
+        # the few longer sessions are kept apart and always checked
+        if self.long_sessions is None:
+            self.long_sessions = np.flatnonzero(self.end - self.start > SECONDS_PER_DAY)
+        first, last = np.searchsorted(self.start, start - SECONDS_PER_DAY, side = "left"), np.searchsorted(self.start, end, side = "right")
+        candidates = np.arange(first, last)
+        candidates = candidates[self.end[candidates] >= start]
+        # The long sessions from first on are already candidates, the others all come before them
+        long_sessions = self.long_sessions[self.long_sessions < first]
+        long_sessions = long_sessions[self.end[long_sessions] >= start]
+        return np.concatenate((long_sessions, candidates))
+
+    def get_days_played(self, first_day = None, last_day = None):
+        # Days on which a session started or ended, as unique (player, day) pairs sorted by day then player
+        if self.days_played is None:
+            keys = np.unique(((np.concatenate((self.start, self.end)) // SECONDS_PER_DAY) << 32) | np.concatenate((self.player, self.player)).astype(np.int64))
+            self.days_played = ((keys & 0xFFFFFFFF).astype(np.int32), keys >> 32)
+        day_player, day = self.days_played
+        first = np.searchsorted(day, first_day, side = "left") if first_day is not None else 0
+        last = np.searchsorted(day, last_day, side = "right") if last_day is not None else len(day)
+        return day_player[first:last], day[first:last]
+
+    def get_daily_play_time(self):
+        # Split every session at the day boundaries, returns the player, day and minutes played of every piece
+        # A session ending exactly at midnight doesn't play on the next day
+        first_day = self.start // SECONDS_PER_DAY
+        day_count = np.maximum(self.end - 1, self.start) // SECONDS_PER_DAY - first_day + 1
+        index = np.repeat(np.arange(len(self)), day_count)
+        day = first_day[index] + np.arange(len(index)) - np.repeat(np.cumsum(day_count) - day_count, day_count)
+        play_time = (np.minimum(self.end[index], (day + 1) * SECONDS_PER_DAY) - np.maximum(self.start[index], day * SECONDS_PER_DAY)) / 60
+        return self.player[index], day, play_time
+
+    def get_hourly_active(self, index, first_hour):
+        # Unique active players of every hour from first_hour to the last hour played by the given sessions
+        last_hour = self.end[index].max() // SECONDS_PER_HOUR if len(index) else first_hour - 1
+        return count_active_players(self.player[index], np.maximum(self.start[index] // SECONDS_PER_HOUR, first_hour) - first_hour, self.end[index] // SECONDS_PER_HOUR - first_hour, last_hour - first_hour + 1)
+
+    def get_hourly_active_players(self, start, end):
+        # Unique active players of every hour of a range, the full hours are read from the rollup
+        # and only the sessions of the partial hours at the edges of the range are read
+        if self.hourly_active is None:
+            first_hour = self.start.min() // SECONDS_PER_HOUR if len(self) else 0
+            self.hourly_active = (first_hour, self.get_hourly_active(np.arange(len(self)), first_hour))
+        first_hour, counts = self.hourly_active
+        min_hour, max_hour = start // SECONDS_PER_HOUR, end // SECONDS_PER_HOUR
+        hours = np.arange(min_hour, max_hour + 1) - first_hour
+        known = (hours >= 0) & (hours < len(counts))
+        active_players = np.zeros(len(hours), dtype = np.int64)
+        active_players[known] = counts[hours[known]]
+        for hour, window_start, window_end in [(min_hour, start, min(end, (min_hour + 1) * SECONDS_PER_HOUR - 1)), (max_hour, max(start, max_hour * SECONDS_PER_HOUR), end)]:
+            active_players[hour - min_hour] = len(np.unique(self.player[self.get_overlapping(window_start, window_end)]))
+        return active_players
+
+    def get_daily_active_players(self, first_day, last_day):
+        # Players active on every day of a range, read from the rollup of get_days_played
+        if self.daily_active is None:
+            day_player, day = self.get_days_played()
+            first = day[0] if len(day) else 0
+            self.daily_active = (first, np.bincount(day - first))
+        first, counts = self.daily_active
+        days = np.arange(first_day, last_day + 1) - first
+        known = (days >= 0) & (days < len(counts))
+        active_players = np.zeros(len(days), dtype = np.int64)
+        active_players[known] = counts[days[known]]
+        return active_players
+
+    def get_play_time(self, start, end):
+        # Minutes played by every player on every day of a range, the full days are read from the rollup
+        # and only the sessions of the partial days at the edges of the range are split into days
+        first_day, last_day = -(-start // SECONDS_PER_DAY), end // SECONDS_PER_DAY
+        if first_day >= last_day:
+            return self.get_subset(self.get_overlapping(start, end)).get_clipped(start, end).get_daily_play_time()
+        day_player, day, play_time = self.get_play_time_rollup()
+        first, last = np.searchsorted(day, first_day, side = "left"), np.searchsorted(day, last_day, side = "left")
+        pieces = [(day_player[first:last], day[first:last], play_time[first:last])]
+        for window_start, window_end in [(start, first_day * SECONDS_PER_DAY), (last_day * SECONDS_PER_DAY, end)]:
+            if window_start < window_end:
+                pieces.append(self.get_subset(self.get_overlapping(window_start, window_end)).get_clipped(window_start, window_end).get_daily_play_time())
+        return tuple(np.concatenate(column) for column in zip(*pieces))
+
+    def get_play_time_rollup(self):
+        if self.daily_play_time is None:
+            self.daily_play_time = sum_daily_play_time(*self.get_daily_play_time())
+        return self.daily_play_time
+
+    def get_revision(self, end):
+        # Number of the last update that changed the sessions before the end of a range, ranges ending earlier are unchanged
+        for revision in range(len(self.changes), 0, -1):
+            if self.changes[revision - 1] <= end:
+                return revision
+        return 0
+
+    def get_player_id(self, player):
+        if self.player_ids is None:
+            self.player_ids = {name: i for i, name in enumerate(self.players)}
+        if player not in self.player_ids:
+            self.player_ids[player] = len(self.players)
+            self.players.append(player)
+        return self.player_ids[player]
+
+    def extend(self, player, start, end):
+        # Sessions are appended to buffers with spare room, so adding a few sessions doesn't copy the whole store
+        count, size = len(self), len(self) + len(start)
+        if self.buffers is None or size > len(self.buffers[0]):
+            capacity = max(2 * size, 1024)
+            self.buffers = (np.empty(capacity, dtype = np.int32), np.empty(capacity, dtype = np.int64), np.empty(capacity, dtype = np.int64))
+            for buffer, values in zip(self.buffers, (self.player, self.start, self.end)):
+                buffer[:count] = values
+        for buffer, values in zip(self.buffers, (player, start, end)):
+            buffer[count:size] = values
+        self.player, self.start, self.end = (buffer[:size] for buffer in self.buffers)
+
+    def add_events(self, events, now, servers = None):
+        # Apply new (player, time, joined) events in time order, the same way get_sessions does for the whole history
+        # The events of merged sessions come with the server of every event, the open sessions are kept by server and player
+        # Returns the earliest changed time, only the aggregates of the ranges ending after it have to be computed again
+        if self.open_sessions is None:
+            self.open_sessions = {(None, int(self.player[i])): int(i) for i in np.flatnonzero(self.end == self.now)}
+        changed_from = min([self.now] + [time for player, time, join in events])
+        # Open sessions last until now
+        self.end[list(self.open_sessions.values())] = now
+        count = len(self)
+        player, start, end = [], [], []
+        for (name, time, join), server in zip(events, servers or itertools.repeat(None)):
+            player_id = self.get_player_id(name)
+            key = (server, player_id)
+            if key in self.open_sessions:
+                # A session never ends before it starts, even if the logs were rewritten with older lines
+                index = self.open_sessions.pop(key)
+                if index < count:
+                    self.end[index] = max(time, self.start[index])
+                else:
+                    end[index - count] = max(time, start[index - count])
+            if join:
+                self.open_sessions[key] = count + len(start)
+                player.append(player_id)
+                start.append(time)
+                end.append(now)
+        self.extend(player, start, end)
+        self.now = now
+
+        if count and start and start[0] < self.start[count - 1]:
+            # Events older than the last known session were added, the store is sorted by start again
+            order = np.argsort(self.start, kind = "stable")
+            position = np.empty_like(order)
+            position[order] = np.arange(len(order))
+            self.player, self.start, self.end = self.player[order], self.start[order], self.end[order]
+            self.open_sessions = {key: int(position[index]) for key, index in self.open_sessions.items()}
+            self.buffers, self.long_sessions = None, None
+            self.hourly_active, self.daily_active, self.daily_play_time = None, None, None
+
+        self.update_aggregates(changed_from)
+        self.changes.append(changed_from)
+        return changed_from
+
+    def update_aggregates(self, changed_from):
+        # Only the sessions ending on or after the first changed day are read again
+        changed_day = changed_from // SECONDS_PER_DAY
+        changed = np.flatnonzero(self.end >= changed_day * SECONDS_PER_DAY)
+        if self.long_sessions is not None:
+            self.long_sessions = np.union1d(self.long_sessions, changed[self.end[changed] - self.start[changed] > SECONDS_PER_DAY])
+        if self.days_played is not None:
+            day_player, day = self.days_played
+            kept = np.searchsorted(day, changed_day, side = "left")
+            keys = ((np.concatenate((self.start[changed], self.end[changed])) // SECONDS_PER_DAY) << 32) | np.concatenate((self.player[changed], self.player[changed])).astype(np.int64)
+            keys = np.unique(np.concatenate(((day[:kept] << 32) | day_player[:kept].astype(np.int64), keys[(keys >> 32) >= changed_day])))
+            self.days_played = ((keys & 0xFFFFFFFF).astype(np.int32), keys >> 32)
+        # The rollups are computed again from the first changed hour or day, or built again on first use if older days changed
+        if self.hourly_active is not None:
+            first_hour, counts = self.hourly_active
+            changed_hour = changed_day * 24
+            self.hourly_active = (first_hour, splice_counts(counts, changed_hour - first_hour, self.get_hourly_active(changed, changed_hour))) if len(counts) and changed_hour >= first_hour else None
+        if self.daily_active is not None:
+            first, counts = self.daily_active
+            day_player, day = self.days_played
+            self.daily_active = (first, splice_counts(counts, changed_day - first, np.bincount(day[np.searchsorted(day, changed_day, side = "left"):] - changed_day))) if len(counts) and changed_day >= first and self.days_played is not None else None
+        if self.daily_play_time is not None:
+            day_player, day, play_time = self.daily_play_time
+            kept = np.searchsorted(day, changed_day, side = "left")
+            changed_play_time = sum_daily_play_time(*self.get_subset(changed).get_clipped(changed_day * SECONDS_PER_DAY, np.iinfo(np.int64).max).get_daily_play_time())
+            self.daily_play_time = tuple(np.concatenate((column[:kept], changed_column)) for column, changed_column in zip(self.daily_play_time, changed_play_time))
+
+    def get_player_indexes(self):
+        # Indexes of the sessions of every player, in start order
+        order = np.argsort(self.player, kind = "stable")
+        return np.split(order, np.cumsum(np.bincount(self.player, minlength = len(self.players)))[:-1])
+
+# Sessions and per player aggregates of a date range, players contains the displayed player ids in display order
+class FilteredData:
+    def __init__(self, store, start_date, end_date, sessions, day_player, day, play_time):
+        count = len(sessions.players)
+        self.store = store
+        self.start_date = start_date
+        self.end_date = end_date
+        self.sessions = sessions
+        self.players = list(range(count))
+        self.filtered = False
+        self.day_player = day_player
+        self.day = day
+        self.play_time_player, self.play_time_day, self.play_time = play_time
+        self.total_played = np.bincount(self.play_time_player, weights = self.play_time, minlength = count)
+        self.session_count = np.bincount(sessions.player, minlength = count)
+        self.day_count = np.bincount(day_player, minlength = count)
+        self.first_seen = np.full(count, np.iinfo(np.int64).max)
+        np.minimum.at(self.first_seen, sessions.player, sessions.start)
+        self.last_seen = np.full(count, np.iinfo(np.int64).min)
+        np.maximum.at(self.last_seen, sessions.player, sessions.end)
+        self.displayed_cache = {}
+
+    def get_ordered(self, players):
+        # Share the sessions and aggregates with a different list of displayed players
+        ordered = copy.copy(self)
+        ordered.players = players
+        return ordered
+
+    def get_name(self, player):
+        return self.sessions.players[player]
+
+    def get_color(self, player):
+        return self.sessions.get_color(player)
+
+    def get_displayed(self, name, compute):
+        # Results that only depend on which players are displayed are shared by every order of these players
+        key = (name, frozenset(self.players))
+        if key not in self.displayed_cache:
+            self.displayed_cache[key] = compute()
+        return self.displayed_cache[key]
+
+    def get_sessions(self):
+        # Sessions of the displayed players only
+        return self.get_displayed("sessions", lambda: self.sessions.get_subset(np.isin(self.sessions.player, self.players)))
+
+    def get_play_time_matrix(self, players, first_day, day_count):
+        # Minutes played by the given players on every day of the range, as a players x days matrix
+        rows = np.full(len(self.sessions.players), -1)
+        rows[players] = np.arange(len(players))
+        in_range = (rows[self.play_time_player] >= 0) & (first_day <= self.play_time_day) & (self.play_time_day < first_day + day_count)
+        cells = rows[self.play_time_player[in_range]] * day_count + (self.play_time_day[in_range] - first_day)
+        return np.bincount(cells, weights = self.play_time[in_range], minlength = len(players) * day_count).reshape(len(players), day_count)
+
+    def get_server_play_time_matrix(self, first_day, day_count):
+        # Minutes played by the displayed players on every day of the range on every server, as a servers x days matrix
+        # Every server is read from its own rollups, its players are matched to the displayed players by name
+        rows = []
+        for server in self.store.servers.values():
+            player_ids = np.array([self.store.get_player_id(name) for name in server.players], dtype = np.int32)
+            displayed = np.zeros(len(self.store.players), dtype = bool)
+            displayed[self.players] = True
+            day_player, day, play_time = server.get_play_time(self.start_date, self.end_date)
+            in_range = displayed[player_ids[day_player]] & (first_day <= day) & (day < first_day + day_count)
+            rows.append(np.bincount(day[in_range] - first_day, weights = play_time[in_range], minlength = day_count))
+        return np.array(rows).reshape(len(rows), day_count)
+
+    def get_hourly_active_players(self):
+        # Unique active players of every hour of the range, the rollups of the store count every player
+        min_hour, max_hour = self.start_date // SECONDS_PER_HOUR, self.end_date // SECONDS_PER_HOUR
+        if not self.filtered:
+            return self.store.get_hourly_active_players(self.start_date, self.end_date)
+        sessions = self.get_sessions()
+        return count_active_players(sessions.player, np.maximum(sessions.start // SECONDS_PER_HOUR, min_hour) - min_hour, np.minimum(sessions.end // SECONDS_PER_HOUR, max_hour) - min_hour, max_hour - min_hour + 1)
+
+    def get_daily_active_players(self):
+        # Players active on every day of the range, the rollups of the store count every player
+        min_day, max_day = self.start_date // SECONDS_PER_DAY, self.end_date // SECONDS_PER_DAY
+        if not self.filtered:
+            return self.store.get_daily_active_players(min_day, max_day)
+        day_player, day = self.get_days_played()
+        return np.bincount(day[(min_day <= day) & (day <= max_day)] - min_day, minlength = max_day - min_day + 1)
+
+    def get_days_played(self):
+        # Days played by the displayed players only
+        def compute():
+            displayed = np.isin(self.day_player, self.players)
+            return self.day_player[displayed], self.day[displayed]
+        return self.get_displayed("days_played", compute)
+
+def format_datetime(datestr, timeofday = None, defaultdate = datetime.now()):
+    try:
+        return datetime.combine(datetime.strptime(datestr, DATE_FORMAT).date(), timeofday) if timeofday else datetime.strptime(datestr, DATE_FORMAT)
+    except ValueError:
+        return defaultdate
+
+def format_number(numstr, defaultvalue = 0):
+    try:
+       return float(numstr)
+    except ValueError:
+        return defaultvalue
+
+
+def trim_zeros(values):
+    # Find the first and last non-empty values to remove the empty values at the beginning and end
+    non_zero = np.flatnonzero(values)
+    return slice(non_zero[0], non_zero[-1] + 1) if len(non_zero) else slice(0, 0)
+
+# Total minutes of every (player, day) pair of play time pieces, sorted by day then player
+def sum_daily_play_time(player, day, play_time):
+    keys, inverse = np.unique((day << 32) | player.astype(np.int64), return_inverse = True)
+    return (keys & 0xFFFFFFFF).astype(np.int32), keys >> 32, np.bincount(inverse, weights = play_time, minlength = len(keys))
+
+# Replace the counts from position on, the missing counts before position are zeros
+def splice_counts(counts, position, tail):
+    head = counts[:position]
+    return np.concatenate((head, np.zeros(position - len(head), dtype = head.dtype), tail))
+
+# Count the unique players active in every bucket, first and last are the inclusive bucket range of every session
+def count_active_players(player, first, last, bucket_count):
+    valid = first <= last
+    # Sort the sessions by player then first bucket, the player is part of the keys so players never overlap
+    span = bucket_count + 1
+    start = player[valid].astype(np.int64) * span + first[valid]
+    order = np.argsort(start)
+    start, end = start[order], (player[valid].astype(np.int64) * span + last[valid])[order]
+    if len(start) == 0:
+        return np.zeros(bucket_count, dtype = np.int64)
+    # Merge the overlapping sessions of a player so the player is only counted once per bucket
+    reach = np.maximum.accumulate(end)
+    merged = np.flatnonzero(np.append(True, start[1:] > reach[:-1]))
+    merged_start, merged_end = start[merged] % span, reach[np.append(merged[1:] - 1, len(start) - 1)] % span
+    # Sweep the merged intervals with a difference array
+    return np.cumsum(np.bincount(merged_start, minlength = span) - np.bincount(merged_end + 1, minlength = span))[:bucket_count]
+
+# Filter data by date range and player filter, the results of the last used ranges and filters are kept so that
+# sort and display changes only reorder them, the revision of the sessions makes new events update the ranges they change
+@lru_cache(maxsize = FILTER_CACHE_SIZE)
+def filter_data(sessions, start_date, end_date, filter_type, filter_min, filter_max, revision = 0):
+    # Filter data by date range
+    day_player, day = sessions.get_days_played(start_date // SECONDS_PER_DAY, end_date // SECONDS_PER_DAY)
+    overlapping = sessions.get_overlapping(start_date, end_date)
+    profiler.count("sessions scanned", len(overlapping))
+    filtered_data = FilteredData(sessions, start_date, end_date, sessions.get_subset(overlapping).get_clipped(start_date, end_date), day_player, day, sessions.get_play_time(start_date, end_date))
+    players = filtered_data.players
+    # Filter data
+    if filter_min > 0 or filter_max > 0:
+        if filter_type == FILTER_TIME_PLAYED:
+            players = [player for player in players if (filter_min <= 0 or filtered_data.total_played[player] >= (filter_min * 60)) and (filter_max <= 0 or filtered_data.total_played[player] <= (filter_max * 60))]
+        elif filter_type == FILTER_DAY_PLAYED:
+            players = [player for player in players if (filter_min <= 0 or filtered_data.day_count[player] >= filter_min) and (filter_max <= 0 or filtered_data.day_count[player] <= filter_max)]
+    filtered_data.players = players
+    filtered_data.filtered = len(players) < len(filtered_data.sessions.players)
+    return filtered_data
+
+# Order the players of filtered data by the given sort mode
+def sort_data(filtered_data, sort_mode, sort_reverse):
+    players = filtered_data.players
+    if sort_mode == SORT_NAME:
+        players = sorted(players, key = lambda player: filtered_data.get_name(player).upper(), reverse = sort_reverse)
+    elif sort_mode == SORT_PLAY_FIRST:
+        players = sorted([player for player in players if filtered_data.session_count[player]], key = lambda player: filtered_data.first_seen[player], reverse = sort_reverse)
+    elif sort_mode == SORT_PLAY_LAST:
+        players = sorted([player for player in players if filtered_data.session_count[player]], key = lambda player: filtered_data.last_seen[player], reverse = sort_reverse)
+    elif sort_mode == SORT_PLAY_TIME:
+        players = sorted(players, key = lambda player: filtered_data.total_played[player], reverse = sort_reverse)
+    elif sort_mode == SORT_PLAY_DAY:
+        players = sorted(players, key = lambda player: filtered_data.day_count[player], reverse = sort_reverse)
+    return filtered_data.get_ordered(players)
+
+# Read the lines appended to a file since the last read, the file is read from the start again when it is replaced or truncated
+class FileFollower:
+    def __init__(self, path, position = 0):
+        self.path = path
+        self.position = position
+        self.file = None
+        self.partial = b""
+
+    def read_lines(self):
+        if self.file is None:
+            if not os.path.exists(self.path):
+                return []
+            self.file = open(self.path, "rb")
+            if os.fstat(self.file.fileno()).st_size < self.position:
+                self.position = 0
+            self.file.seek(self.position)
+        content = self.partial + self.file.read()
+        self.position = self.file.tell()
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            stat = None
+        if stat is None or stat.st_ino != os.fstat(self.file.fileno()).st_ino:
+            # The file was rotated, the end of the old file has just been read and the new file is read from its start
+            self.file.close()
+            self.file, self.position = None, 0
+            content += b"\n"
+        elif stat.st_size < self.position:
+            # The file was truncated
+            self.file.seek(0)
+            self.position = 0
+        lines = content.split(b"\n")
+        # The last line may still be incomplete
+        self.partial = lines.pop()
+        return lines
+
+# Follow the data files and the server log, and add their new events to the sessions
+class LogFollower:
+    def __init__(self, sessions):
+        self.sessions = sessions
+        # The data files are followed from where they were read, the server log since it was created
+        self.data_files = [(FileFollower(path, size), TimestampParser()) for path, size in sessions.sources.items()]
+        self.log_file = FileFollower(sessions.log_file) if sessions.log_file else None
+        self.connected_players = []
+        # The log extractor writes the events of the server log into the data files once the log is archived, the events
+        # read from the server log are counted so the same events of the data files are only applied once
+        self.log_events = Counter()
+        # Sessions merged from several servers follow the files of every server, the events of a server are added to its own sessions too
+        self.servers = [(name, LogFollower(server)) for name, server in sessions.servers.items() if server is not sessions]
+
+    def read_events(self):
+        events = []
+        if self.log_file is not None:
+            events.extend(read_log_events(self.log_file.read_lines(), self.connected_players))
+            self.log_events.update(events)
+        for follower, timestamp_parser in self.data_files:
+            for event in read_player_events(follower.read_lines(), timestamp_parser):
+                if self.log_events[event]:
+                    self.log_events[event] -= 1
+                    if not self.log_events[event]:
+                        del self.log_events[event]
+                else:
+                    events.append(event)
+        return sorted(events, key = lambda event: event[1])
+
+    def update(self, now):
+        # Returns the earliest changed time, or None when the sessions didn't change
+        events = [(event, None) for event in self.read_events()]
+        for name, server in self.servers:
+            server_events = server.read_events()
+            if server_events or now - server.sessions.now >= FOLLOW_IDLE_INTERVAL:
+                server.sessions.add_events(server_events, now)
+            events.extend((event, name) for event in server_events)
+        if not events and now - self.sessions.now < FOLLOW_IDLE_INTERVAL:
+            return None
+        events.sort(key = lambda event: event[0][1])
+        return self.sessions.add_events([event for event, server in events], now, [server for event, server in events])
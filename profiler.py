@@ -0,0 +1,146 @@
+import os
+from contextlib import contextmanager
+from datetime import datetime
+from threading import Lock
+from time import perf_counter
+
+# Constants
+# Environment variable selecting a capture of every refresh, one of PROFILE_MODES, the --profile option of the programs does the same
+PROFILE_ENV = "PLAYER_CHARTS_PROFILE"
+PROFILE_CPROFILE = "cprofile"
+PROFILE_TRACEMALLOC = "tracemalloc"
+PROFILE_MODES = [PROFILE_CPROFILE, PROFILE_TRACEMALLOC]
+# Summary of every refresh, and cProfile statistics of every refresh when they are captured
+PROFILE_LOG_FILE = "./cache/profile.log"
+PROFILE_LOG_SIZE = 1024 * 1024
+PROFILE_LOG_BACKUPS = 3
+PROFILE_FOLDER = "./cache/profiles"
+# Number of functions of the cProfile statistics written in the log file
+PROFILE_TOP_FUNCTIONS = 15
+
+# Time spent in every stage and counters of one refresh, spans with the same name are added together
+class Refresh:
+    def __init__(self, name, mode = None):
+        self.name = name
+        self.mode = mode
+        self.spans = {}
+        self.counters = {}
+        self.lock = Lock()
+        self.start = perf_counter()
+        self.duration = None
+        self.profile = None
+        self.profile_path = None
+        self.peak_memory = None
+
+    @contextmanager
+    def span(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.spans[name] = self.spans.get(name, 0) + perf_counter() - start
+
+    def count(self, name, value = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    # Start the capture in the thread doing the work of the refresh, cProfile only sees the thread it was enabled in
+    # The profilers are only imported when a capture is selected, so the spans and counters stay cheap to import
+    def start_capture(self):
+        if self.mode == PROFILE_CPROFILE:
+            import cProfile
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        elif self.mode == PROFILE_TRACEMALLOC:
+            import tracemalloc
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+
+    def stop_capture(self):
+        if self.duration is not None:
+            return
+        self.duration = perf_counter() - self.start
+        if self.profile is not None:
+            self.profile.disable()
+            os.makedirs(PROFILE_FOLDER, exist_ok = True)
+            self.profile_path = os.path.join(PROFILE_FOLDER, f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.prof")
+            self.profile.dump_stats(self.profile_path)
+        elif self.mode == PROFILE_TRACEMALLOC:
+            import tracemalloc
+            if tracemalloc.is_tracing():
+                self.peak_memory = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+    def get_summary(self):
+        with self.lock:
+            spans = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.spans.items())
+            counters = ", ".join(f"{value:,} {name}" for name, value in self.counters.items())
+        summary = f"{self.name}: {(self.duration or perf_counter() - self.start) * 1000:.0f} ms" + (f" ({spans})" if spans else "")
+        if counters:
+            summary += f" - {counters}"
+        if self.peak_memory is not None:
+            summary += f" - {self.peak_memory / 1024 / 1024:.1f} MB peak"
+        return summary
+
+    def get_profile_statistics(self):
+        import io
+        import pstats
+        output = io.StringIO()
+        pstats.Stats(self.profile, stream = output).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+        return output.getvalue()
+
+# Capture selected by the environment, None to only record the spans and counters
+mode = os.environ.get(PROFILE_ENV) or None
+# Refresh the spans and counters of every module are added to, the work done outside of a refresh is added to an idle refresh
+current = Refresh("Idle")
+logger = None
+
+def set_mode(profile_mode):
+    global mode
+    if profile_mode is not None and profile_mode not in PROFILE_MODES:
+        print(f"Unknown profile mode '{profile_mode}', use one of {', '.join(PROFILE_MODES)}.")
+        profile_mode = None
+    mode = profile_mode
+
+def get_logger():
+    global logger
+    if logger is None:
+        import logging
+        from logging.handlers import RotatingFileHandler
+        os.makedirs(os.path.dirname(PROFILE_LOG_FILE), exist_ok = True)
+        handler = RotatingFileHandler(PROFILE_LOG_FILE, maxBytes = PROFILE_LOG_SIZE, backupCount = PROFILE_LOG_BACKUPS, encoding = "utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        logger = logging.getLogger("profiler")
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        # The summaries only go to the log file
+        logger.propagate = False
+    return logger
+
+# Start a refresh from the thread doing its work, the spans and counters added from now on belong to it
+def start(name):
+    global current
+    current = Refresh(name, mode if mode in PROFILE_MODES else None)
+    current.start_capture()
+    return current
+
+def span(name):
+    return current.span(name)
+
+def count(name, value = 1):
+    current.count(name, value)
+
+# End a refresh and write its summary in the log file, returns the summary
+def finish(refresh):
+    refresh.stop_capture()
+    summary = refresh.get_summary()
+    try:
+        get_logger().info(summary)
+        if refresh.profile is not None:
+            get_logger().info(f"cProfile statistics saved to {refresh.profile_path}\n{refresh.get_profile_statistics()}")
+    except OSError as e:
+        print(f"Profile log could not be written.\nError: {e}")
+    return summary